@@ -1,21 +1,22 @@
 import streamlit as st
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from src.dashboard import render_dashboard
+import importlib
 import logging
 import os
 from datetime import datetime
-from src.drive_manager import DriveManager
-from src.inventory_review import inventory_review_page
-from src.inventory_manager import initialize_inventory
-from src.registration_page import registration_page  
-from src.calibration_page import calibration_page   # Updated import
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Sidebar page -> (module, entry point). Pages are imported on first visit so a
+# cold start only pays for the page that is actually opened.
+PAGES = {
+    "Dashboard": ("src.dashboard", "render_dashboard"),
+    "Probe Registration": ("src.registration_page", "registration_page"),
+    "Probe Calibration": ("src.calibration_page", "calibration_page"),
+    "Inventory Review": ("src.inventory_review", "inventory_review_page"),
+}
+
 # Default Google Drive folder ID
 DRIVE_FOLDER_ID = "19lHngxB_RXEpr30jpY9_fCaSpl6Z1m1i"
 
@@ -44,8 +45,17 @@ CLIENT_CONFIG = {
     }
 }
 
+def load_page(page):
+    """Import a page module on first use and return its entry point"""
+    module_name, function_name = PAGES[page]
+    return getattr(importlib.import_module(module_name), function_name)
+
 def init_google_auth():
     """Initialize Google authentication."""
+    from google_auth_oauthlib.flow import Flow
+    from src.drive_manager import DriveManager
+    from src.inventory_manager import initialize_inventory
+
     try:
         # Use updated query_params instead of experimental_get_query_params
         params = st.query_params
@@ -89,6 +99,8 @@ def init_google_auth():
 def check_user_auth():
     """Check and handle user authentication"""
     if 'credentials' not in st.session_state:
+        from google_auth_oauthlib.flow import Flow
+
         try:
             flow = Flow.from_client_config(
                 client_config=CLIENT_CONFIG,
@@ -125,16 +137,22 @@ def main():
             st.write("Please log in to access the application.")
             return
 
+        from src.google_clients import get_google_clients
+        from src.inventory_manager import initialize_inventory, get_write_queue, get_persistence_service
+        from src.inventory_store import get_inventory_store
+        from src.drive_transport import DRIVE_METRICS
+
         # Validate user email domain
         try:
-            user_info_service = build('oauth2', 'v2', credentials=st.session_state['credentials'])
-            user_info = user_info_service.userinfo().get().execute()
+            # Cached per credential, so reruns make no auth round trip
+            user_info = get_google_clients().user_info(st.session_state['credentials'])
 
             if user_info['email'].endswith('@ketos.co'):
                 st.sidebar.text(f"Logged in as: {user_info['name']}")
             else:
                 st.error("Access denied. Please use your @ketos.co email.")
                 if st.button("Logout"):
+                    get_google_clients().forget(st.session_state['credentials'])
                     st.session_state.clear()
                     st.rerun()
                 return
@@ -145,32 +163,40 @@ def main():
             st.rerun()
             return
 
+        # Point this session at the shared inventory
+        initialize_inventory()
+        get_persistence_service().start()
+
+        # Pending writes indicator
+        write_queue = get_write_queue()
+        pending_writes = write_queue.pending_count()
+        if pending_writes:
+            st.sidebar.caption(f"⏳ {pending_writes} pending write(s)")
+            if st.sidebar.button("Save Now"):
+                if write_queue.flush():
+                    st.sidebar.success("✅ All changes saved")
+                else:
+                    st.sidebar.error("❌ Save failed, will retry")
+        else:
+            st.sidebar.caption(f"✅ All changes saved ({write_queue.last_flush_time or 'nothing pending'})")
+
         # Debug information
         with st.sidebar.expander("Debug Info", expanded=False):
             st.write({
                 "Authentication Status": 'credentials' in st.session_state,
                 "Drive Connected": 'drive_manager' in st.session_state,
                 "Inventory Loaded": 'inventory' in st.session_state,
-                "Email": user_info.get('email', 'Not available')
+                "Email": user_info.get('email', 'Not available'),
+                "Inventory Cache": get_inventory_store().stats(),
+                "Persistence": get_persistence_service().metrics(),
+                "Drive Calls": DRIVE_METRICS.snapshot()
             })
 
         # Updated sidebar navigation with separate registration and calibration pages
-        page = st.sidebar.radio(
-            "Navigate to",
-            ["Dashboard", "Probe Registration", "Probe Calibration", "Inventory Review"]
-        )
+        page = st.sidebar.radio("Navigate to", list(PAGES))
 
         # Page routing
-        if page == "Probe Registration":
-            registration_page()
-        elif page == "Dashboard":
-            render_dashboard()
-        elif page == "Probe Registration":
-            registration_page()
-        elif page == "Probe Calibration":
-            calibration_page()
-        elif page == "Inventory Review":
-            inventory_review_page()
+        load_page(page)()
 
     except Exception as e:
         logger.error(f"Application error: {str(e)}")
@@ -0,0 +1,78 @@
+"""Calibration drift analytics benchmark: full fleet build and one-probe update.
+
+Writes a synthetic pH calibration history to a temporary directory, then
+times the first summary, an unchanged re-read, and the incremental update
+after one more calibration is saved.
+
+    python benchmarks/calibration_analytics.py [--probes 20000] [--calibrations 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.calibration_history import CalibrationHistory, PH_BUFFERS, apply_event_schema  # noqa: E402
+from src.calibration_analytics import CalibrationAnalytics, BUFFER_PH, NERNST_SLOPE  # noqa: E402
+
+
+def synthetic_events(probes, calibrations, seed=0):
+    rng = np.random.default_rng(seed)
+    per_probe = calibrations * len(PH_BUFFERS)
+    buffers = np.tile([BUFFER_PH[label] for label in PH_BUFFERS], probes * calibrations)
+    dates = pd.date_range("2022-01-01", periods=calibrations, freq="180D").values
+    slope = NERNST_SLOPE * rng.normal(0.98, 0.02, probes).repeat(per_probe)
+    offset = rng.normal(0, 8, probes).repeat(per_probe)
+    millivolts = offset + slope * (buffers - 7)
+    return apply_event_schema(pd.DataFrame({
+        "Serial Number": np.repeat([f"pH_{i:05d}" for i in range(probes)], per_probe),
+        "Calibration Date": np.tile(np.repeat(dates, len(PH_BUFFERS)), probes),
+        "Probe Type": "pH Probe",
+        "Standard": np.tile(PH_BUFFERS, probes * calibrations),
+        "Unit": "pH",
+        "Initial": buffers + rng.normal(0, 0.05, len(buffers)),
+        "Calibrated": buffers,
+        "Initial mV": millivolts,
+        "Calibrated mV": millivolts,
+        "Recorded At": pd.Timestamp.now(),
+    }))
+
+
+def timed(label, action):
+    start = time.perf_counter()
+    result = action()
+    print(f"{label:<32}{(time.perf_counter() - start) * 1000:>12.1f}")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--probes", type=int, default=20000)
+    parser.add_argument("--calibrations", type=int, default=3, help="calibrations per probe")
+    args = parser.parse_args()
+
+    events = synthetic_events(args.probes, args.calibrations)
+    with tempfile.TemporaryDirectory() as directory:
+        history = CalibrationHistory(directory)
+        history.append(events)
+        analytics = CalibrationAnalytics(history)
+
+        print(f"{len(events)} events, {args.probes} probes")
+        print(f"{'measurement':<32}{'time (ms)':>12}")
+        timed("full summary", analytics.summary)
+        timed("unchanged summary", analytics.summary)
+
+        latest = events[events["Serial Number"] == "pH_00000"].tail(len(PH_BUFFERS)).copy()
+        latest["Calibration Date"] = latest["Calibration Date"] + pd.Timedelta(days=180)
+        history.append(latest)
+        timed("summary after one calibration", analytics.summary)
+
+
+if __name__ == "__main__":
+    main()
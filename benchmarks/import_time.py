@@ -0,0 +1,74 @@
+"""Cold-start benchmark: module import times and first paint of the login page.
+
+Every measurement runs in a fresh interpreter so nothing is already in
+sys.modules, which is what a container restart sees.
+
+    python benchmarks/import_time.py [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "src",
+    "src.inventory_manager",
+    "src.dashboard",
+    "src.registration_page",
+    "src.calibration_page",
+    "src.inventory_review",
+    "plotly.express",
+]
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+# Runs app.py once, unauthenticated, the way the first request after a restart does
+FIRST_PAINT_SNIPPET = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+AppTest.from_file("app.py", default_timeout=60).run()
+print(time.perf_counter() - start)
+"""
+
+
+def measure(snippet, runs):
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_CLIENT_ID", "benchmark")
+    env.setdefault("GOOGLE_CLIENT_SECRET", "benchmark")
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", snippet],
+            cwd=ROOT, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1]
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    args = parser.parse_args()
+
+    print(f"{'measurement':<32}{'median (ms)':>12}")
+    for module in MODULES:
+        seconds, error = measure(IMPORT_SNIPPET.format(module=module), args.runs)
+        print(f"{'import ' + module:<32}{error or f'{seconds * 1000:>12.1f}'}")
+
+    seconds, error = measure(FIRST_PAINT_SNIPPET, args.runs)
+    print(f"{'first paint (login page)':<32}{error or f'{seconds * 1000:>12.1f}'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,20 @@
-from src.registration_page import registration_page
-from src.calibration_page import calibration_page
-from .inventory_review import inventory_review_page
-from .inventory_manager import initialize_inventory
-from .drive_manager import DriveManager
-
-__all__ = [
-    'registration_calibration_page',
-    'inventory_review_page',
-    'initialize_inventory',
-    'DriveManager'
-]
+import importlib
+
+# Page entry points, imported on first use so importing the package is cheap
+# and free of side effects
+_EXPORTS = {
+    'registration_page': '.registration_page',
+    'calibration_page': '.calibration_page',
+    'inventory_review_page': '.inventory_review',
+    'render_dashboard': '.dashboard',
+    'initialize_inventory': '.inventory_manager',
+    'DriveManager': '.drive_manager',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,287 @@
+import streamlit as st
+import pandas as pd
+import hashlib
+import threading
+import json
+import time
+import os
+import logging
+from datetime import datetime
+from .inventory_storage import (
+    PARQUET_AVAILABLE,
+    PARQUET_MIMETYPE,
+    INVENTORY_COLUMNS,
+    apply_schema,
+    read_inventory_csv
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+BACKUP_DIRECTORY = os.environ.get("INVENTORY_BACKUP_DIR", "backups")
+MANIFEST_FILENAME = "manifest.json"
+# Set INVENTORY_BACKUP_DELTAS=1 to store changed rows between full snapshots
+DELTA_BACKUPS = os.environ.get("INVENTORY_BACKUP_DELTAS", "").lower() in ("1", "true", "yes")
+FULL_SNAPSHOT_EVERY = 10  # deltas between full snapshots
+
+# Retention tiers: keep the newest backup per bucket, for this many buckets
+RETENTION_POLICY = (
+    (3600, 24),        # hourly for a day
+    (86400, 30),       # daily for a month
+    (7 * 86400, 52),   # weekly for a year
+)
+
+
+def row_hashes(inventory_df):
+    """One 64-bit hash per probe row over the schema columns"""
+    df = apply_schema(inventory_df)[INVENTORY_COLUMNS]
+    return pd.Series(
+        pd.util.hash_pandas_object(df, index=False).to_numpy(),
+        index=df['Serial Number'].to_numpy()
+    )
+
+
+def content_hash(hashes):
+    """Digest of a whole inventory from its row hashes"""
+    return hashlib.sha256(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def retained(entries, now, policy=RETENTION_POLICY):
+    """Names of the backups the thinning policy keeps, plus the bases of kept deltas"""
+    newest_first = sorted(entries, key=lambda entry: entry['timestamp'], reverse=True)
+    keep = {newest_first[0]['name']} if newest_first else set()
+    for bucket_seconds, count in policy:
+        seen = set()
+        for entry in newest_first:
+            if now - entry['timestamp'] >= bucket_seconds * count:
+                break
+            bucket = int(entry['timestamp'] // bucket_seconds)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(entry['name'])
+    keep |= {entry['base'] for entry in entries if entry['name'] in keep and entry.get('base')}
+    return keep
+
+
+class BackupManager:
+    """Compressed, deduplicated inventory snapshots with retention thinning.
+
+    A snapshot is skipped when the inventory's content hash matches the latest
+    backup. Snapshots are Parquet (zstd) or gzip CSV; with deltas enabled only
+    rows changed since the last full snapshot are written, with a full one
+    every FULL_SNAPSHOT_EVERY backups. ``manifest.json`` records every backup
+    and its Drive copy, so pruning can remove both.
+    """
+
+    def __init__(self, directory=BACKUP_DIRECTORY, deltas=DELTA_BACKUPS,
+                 full_every=FULL_SNAPSHOT_EVERY, policy=RETENTION_POLICY):
+        self.directory = directory
+        self.deltas = deltas
+        self.full_every = full_every
+        self.policy = policy
+        self._lock = threading.Lock()
+        self._base_hashes = {}  # full snapshot name -> row hashes
+        os.makedirs(directory, exist_ok=True)
+        self._entries = self._read_manifest()
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry) for entry in self._entries]
+
+    def snapshot(self, inventory_df, now=None):
+        """Back up the inventory unless it is unchanged; returns the new entry or None"""
+        now = time.time() if now is None else now
+        hashes = row_hashes(inventory_df)
+        digest = content_hash(hashes)
+        with self._lock:
+            if self._entries and self._entries[-1]['hash'] == digest:
+                logger.info("Inventory unchanged since last backup, skipping")
+                return None
+
+            stamp = datetime.fromtimestamp(now).strftime('%Y%m%d%H%M%S')
+            base = self._delta_base()
+            if base is not None:
+                base_hashes = self._hashes_of(base)
+                base_hashes = base_hashes[~base_hashes.index.duplicated(keep='last')]
+                changed = ~hashes.index.isin(base_hashes.index) | (
+                    hashes.to_numpy() != base_hashes.reindex(hashes.index).to_numpy()
+                )
+                rows = inventory_df[changed]
+                removed = sorted(set(base_hashes.index) - set(hashes.index))
+                entry = {'kind': 'delta', 'base': base['name'], 'removed': removed}
+            else:
+                rows = inventory_df
+                entry = {'kind': 'full', 'base': None, 'removed': []}
+
+            name = f"inventory_backup_{stamp}_{digest[:8]}_{entry['kind']}{self._extension()}"
+            path = os.path.join(self.directory, name)
+            self._write_frame(rows, path)
+            entry.update({
+                'name': name,
+                'timestamp': now,
+                'hash': digest,
+                'rows': len(rows),
+                'bytes': os.path.getsize(path),
+                'drive_id': None
+            })
+            if entry['kind'] == 'full':
+                self._base_hashes = {name: hashes}
+            self._entries.append(entry)
+            self._write_manifest()
+            logger.info(f"Created {entry['kind']} backup {name}: {entry['rows']} rows, {entry['bytes']} bytes")
+            return dict(entry)
+
+    def upload(self, entry, drive_manager, folder_id):
+        """Copy a backup to Drive and record its file ID"""
+        if entry.get('kind') == 'delta':
+            # A delta is useless on Drive without its base
+            base = self._find(entry['base'])
+            if base is not None and not base.get('drive_id'):
+                self.upload(base, drive_manager, folder_id)
+        file_id = drive_manager.upload_file(
+            os.path.join(self.directory, entry['name']), folder_id, self._mimetype()
+        )
+        if not file_id:
+            return False
+        with self._lock:
+            stored = self._find(entry['name'])
+            if stored is not None:
+                stored['drive_id'] = file_id
+                self._write_manifest()
+        return True
+
+    def upload_pending(self, drive_manager, folder_id):
+        """Copy every backup not yet on Drive there, oldest first; returns how many"""
+        with self._lock:
+            pending = [dict(entry) for entry in self._entries if not entry.get('drive_id')]
+        uploaded = 0
+        for entry in pending:
+            # A delta's upload may already have sent this entry as its base
+            with self._lock:
+                stored = self._find(entry['name'])
+            if stored is None or stored.get('drive_id'):
+                continue
+            if not self.upload(entry, drive_manager, folder_id):
+                break
+            uploaded += 1
+        return uploaded
+
+    def prune(self, drive_manager=None, now=None):
+        """Delete backups the retention policy no longer keeps, locally and on Drive.
+
+        Without a drive_manager, backups that have a Drive copy are kept until
+        one is available, so their Drive copies are not orphaned.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            keep = retained(self._entries, now, self.policy)
+            removed = [
+                entry for entry in self._entries
+                if entry['name'] not in keep and (drive_manager is not None or not entry.get('drive_id'))
+            ]
+            if not removed:
+                return []
+            for entry in removed:
+                try:
+                    os.remove(os.path.join(self.directory, entry['name']))
+                except FileNotFoundError:
+                    pass
+                self._base_hashes.pop(entry['name'], None)
+            removed_names = {entry['name'] for entry in removed}
+            self._entries = [entry for entry in self._entries if entry['name'] not in removed_names]
+            self._write_manifest()
+
+        drive_ids = [entry['drive_id'] for entry in removed if entry.get('drive_id')]
+        if drive_manager is not None and drive_ids:
+            drive_manager.trash_files(drive_ids)
+        logger.info(f"Pruned {len(removed)} backups")
+        return removed
+
+    def restore(self, name):
+        """Rebuild the inventory stored in a backup"""
+        with self._lock:
+            entry = self._find(name)
+        if entry is None:
+            raise FileNotFoundError(f"No backup named {name}")
+        df = self._read_frame(os.path.join(self.directory, entry['name']))
+        if entry['kind'] == 'full':
+            return df
+        base_df = self.restore(entry['base'])
+        replaced = set(entry['removed']) | set(df['Serial Number'])
+        return pd.concat(
+            [base_df[~base_df['Serial Number'].isin(replaced)], df],
+            ignore_index=True
+        )
+
+    def stats(self):
+        """Backup counts and sizes for display"""
+        with self._lock:
+            return {
+                "Backups": len(self._entries),
+                "Full": sum(entry['kind'] == 'full' for entry in self._entries),
+                "Bytes": sum(entry['bytes'] for entry in self._entries),
+                "Latest": self._entries[-1]['name'] if self._entries else None
+            }
+
+    def _delta_base(self):
+        """The full snapshot a new delta should be taken against, or None for a full one"""
+        if not self.deltas:
+            return None
+        since_full = 0
+        for entry in reversed(self._entries):
+            if entry['kind'] == 'full':
+                return entry if since_full < self.full_every else None
+            since_full += 1
+        return None
+
+    def _hashes_of(self, entry):
+        if entry['name'] not in self._base_hashes:
+            df = self._read_frame(os.path.join(self.directory, entry['name']))
+            self._base_hashes = {entry['name']: row_hashes(df)}
+        return self._base_hashes[entry['name']]
+
+    def _find(self, name):
+        return next((entry for entry in self._entries if entry['name'] == name), None)
+
+    def _extension(self):
+        return ".parquet" if PARQUET_AVAILABLE else ".csv.gz"
+
+    def _mimetype(self):
+        return PARQUET_MIMETYPE if PARQUET_AVAILABLE else "application/gzip"
+
+    def _write_frame(self, df, path):
+        temp_path = f"{path}.tmp"
+        if path.endswith('.parquet'):
+            apply_schema(df).to_parquet(temp_path, index=False, compression='zstd')
+        else:
+            df.to_csv(temp_path, index=False, compression='gzip')
+        os.replace(temp_path, path)
+
+    def _read_frame(self, path):
+        if path.endswith('.parquet'):
+            return apply_schema(pd.read_parquet(path))
+        return apply_schema(read_inventory_csv(path, compression='gzip'))
+
+    def _read_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILENAME)
+        try:
+            if os.path.exists(path):
+                with open(path) as f:
+                    return json.load(f)
+        except Exception as e:
+            logger.error(f"Error reading backup manifest: {str(e)}")
+        return []
+
+    def _write_manifest(self):
+        path = os.path.join(self.directory, MANIFEST_FILENAME)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self._entries, f, indent=1)
+        os.replace(temp_path, path)
+
+
+@st.cache_resource
+def get_backup_manager():
+    """Get the single backup manager for this server process"""
+    return BackupManager()
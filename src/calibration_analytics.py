@@ -0,0 +1,188 @@
+import streamlit as st
+import pandas as pd
+import numpy as np
+import threading
+import logging
+from .calibration_history import PH_BUFFERS, get_calibration_history
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CALIBRATION_KEY = ["Serial Number", "Calibration Date"]
+# Ideal pH electrode response at 25 °C, in mV per pH unit
+NERNST_SLOPE = -59.16
+BUFFER_PH = {label: float(label.split(" ", 1)[1]) for label in PH_BUFFERS}
+# Acceptance limits for a pH electrode
+SLOPE_LIMITS = (95.0, 105.0)  # percent of the Nernst slope
+OFFSET_LIMIT = 30.0  # mV at pH 7
+# Modified z-score above which a drift rate is an outlier for its probe type
+OUTLIER_Z = 3.5
+
+FLAG_SLOPE = "Slope"
+FLAG_OFFSET = "Offset"
+FLAG_DRIFT = "Drift"
+
+SUMMARY_DTYPES = {
+    "Serial Number": object,
+    "Probe Type": object,
+    "Calibration Date": "datetime64[ns]",
+    "Standards": "int64",
+    "Slope (mV/pH)": "float64",
+    "Slope %": "float64",
+    "Offset (mV)": "float64",
+    "Reading Error %": "float64",
+    "Days Since Previous": "float64",
+    "Drift per Day": "float64",
+    "Offset Drift (mV/day)": "float64",
+}
+SUMMARY_COLUMNS = list(SUMMARY_DTYPES)
+
+
+def calibration_summary(events):
+    """One row of metrics per calibration (probe and date), in one vectorized pass.
+
+    pH calibrations get a least-squares slope and pH 7 offset from the buffer
+    mV readings; a 0 mV reading is an unfilled form field, not a measurement.
+    Every calibration gets its mean absolute relative reading error,
+    |Initial - Calibrated| / |Calibrated| per standard, so standards in
+    different units can be averaged and errors cannot cancel; divided by the
+    days since the probe's previous calibration, that is its drift per day.
+    """
+    if events.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS).astype(SUMMARY_DTYPES)
+
+    buffer_ph = events['Standard'].map(BUFFER_PH)
+    buffer_mv = events['Calibrated mV'].where(events['Calibrated mV'] != 0).fillna(
+        events['Initial mV'].where(events['Initial mV'] != 0)
+    )
+    valid = (events['Probe Type'] == 'pH Probe') & buffer_ph.notna() & buffer_mv.notna()
+    x = buffer_ph.where(valid)
+    y = buffer_mv.where(valid)
+
+    grouped = pd.DataFrame({
+        'Serial Number': events['Serial Number'],
+        'Calibration Date': events['Calibration Date'],
+        'Probe Type': events['Probe Type'],
+        'n': valid.astype('float64'),
+        'x': x, 'y': y, 'xy': x * y, 'xx': x * x,
+        'error': (events['Initial'] - events['Calibrated']).abs()
+                 / events['Calibrated'].abs().where(events['Calibrated'] != 0) * 100,
+    }).groupby(CALIBRATION_KEY, sort=False)
+    sums = grouped[['n', 'x', 'y', 'xy', 'xx']].sum(min_count=1)
+    summary = grouped['Probe Type'].first().to_frame()
+    summary['Standards'] = grouped.size()
+
+    n = sums['n']
+    denominator = n * sums['xx'] - sums['x'] ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (n * sums['xy'] - sums['x'] * sums['y']) / denominator
+        slope = slope.where((n >= 2) & (denominator > 0))
+        summary['Slope (mV/pH)'] = slope
+        summary['Slope %'] = slope / NERNST_SLOPE * 100
+        summary['Offset (mV)'] = sums['y'] / n + slope * (7 - sums['x'] / n)
+    summary['Reading Error %'] = grouped['error'].mean()
+
+    summary = summary.reset_index().sort_values(CALIBRATION_KEY, kind='stable')
+    previous = summary.groupby('Serial Number', sort=False)[['Calibration Date', 'Offset (mV)']].shift()
+    days = (summary['Calibration Date'] - previous['Calibration Date']).dt.days.astype('float64')
+    days = days.where(days > 0)
+    summary['Days Since Previous'] = days
+    summary['Drift per Day'] = summary['Reading Error %'] / days
+    summary['Offset Drift (mV/day)'] = (summary['Offset (mV)'] - previous['Offset (mV)']) / days
+    return summary[SUMMARY_COLUMNS].astype(SUMMARY_DTYPES).reset_index(drop=True)
+
+
+def flag_outliers(summary):
+    """Add acceptance and fleet outlier flags to a calibration summary.
+
+    Drift outliers use the modified z-score (median and MAD) of Drift per
+    Day within each probe type, so a few bad probes do not hide each other.
+    """
+    summary = summary.copy()
+    slope = summary['Slope %']
+    bad_slope = slope.notna() & ~slope.between(*SLOPE_LIMITS)
+    bad_offset = summary['Offset (mV)'].abs() > OFFSET_LIMIT
+
+    drift = summary['Drift per Day']
+    by_type = drift.groupby(summary['Probe Type'])
+    median = by_type.transform('median')
+    mad = (drift - median).abs().groupby(summary['Probe Type']).transform('median')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = 0.6745 * (drift - median) / mad
+    summary['Drift Z'] = z.where(mad > 0)
+    bad_drift = summary['Drift Z'] > OUTLIER_Z
+
+    flags = pd.DataFrame({FLAG_SLOPE: bad_slope, FLAG_OFFSET: bad_offset, FLAG_DRIFT: bad_drift})
+    summary['Flags'] = flags.dot(flags.columns + ', ').str.rstrip(', ')
+    summary['Flagged'] = flags.any(axis=1)
+    return summary
+
+
+def latest_per_probe(summary):
+    """Each probe's most recent calibration"""
+    return summary.drop_duplicates('Serial Number', keep='last').reset_index(drop=True)
+
+
+def fleet_drift(summary):
+    """Median metrics and flag counts per probe type"""
+    if summary.empty:
+        return pd.DataFrame()
+    return summary.groupby('Probe Type').agg(**{
+        'Calibrations': ('Serial Number', 'size'),
+        'Probes': ('Serial Number', 'nunique'),
+        'Median Slope %': ('Slope %', 'median'),
+        'Median Drift per Day': ('Drift per Day', 'median'),
+        'Flagged': ('Flagged', 'sum'),
+    })
+
+
+class CalibrationAnalytics:
+    """Drift metrics over the calibration history, kept up to date incrementally.
+
+    The first call summarises every event. After that only the probes whose
+    history changed since the last call (per ``changes_since``) are
+    recomputed; the fleet-wide outlier flags are then re-derived from the
+    per-calibration rows, which is cheap.
+    """
+
+    def __init__(self, history):
+        self._history = history
+        self._lock = threading.Lock()
+        self._base = None
+        self._summary = None
+        self._version = None
+
+    def summary(self):
+        """Per-calibration metrics and flags for the whole fleet"""
+        with self._lock:
+            if self._base is None:
+                version, serials = self._history.version, None
+            else:
+                version, serials = self._history.changes_since(self._version)
+                if not serials and serials is not None:
+                    return self._summary
+
+            if serials is None:
+                base = calibration_summary(self._history.all_events())
+            else:
+                changed = calibration_summary(
+                    pd.concat([self._history.history(serial) for serial in serials], ignore_index=True)
+                )
+                kept = self._base[~self._base['Serial Number'].isin(serials)]
+                base = pd.concat([kept, changed], ignore_index=True).sort_values(CALIBRATION_KEY, kind='stable')
+            self._base = base.reset_index(drop=True)
+            self._summary = flag_outliers(self._base)
+            self._version = version
+            return self._summary
+
+    def probe(self, serial_number):
+        """One probe's calibrations, oldest first"""
+        summary = self.summary()
+        return summary[summary['Serial Number'] == serial_number].reset_index(drop=True)
+
+
+@st.cache_resource
+def get_calibration_analytics():
+    """Get the calibration analytics shared by every session"""
+    return CalibrationAnalytics(get_calibration_history())
@@ -0,0 +1,454 @@
+import streamlit as st
+import pandas as pd
+import threading
+import json
+import uuid
+import os
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from .inventory_storage import PARQUET_AVAILABLE, PARQUET_MIMETYPE
+
+if PARQUET_AVAILABLE:
+    import pyarrow.parquet as pq
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CALIBRATION_DIRECTORY = os.environ.get("CALIBRATION_HISTORY_DIR", "calibration_history")
+# Immutable event segments, mirrored one-to-one in the Drive folder
+EVENT_PREFIX = "wbpms_calibration_events_"
+# Merged segments are event segments too, so they reach Drive like any other
+COMPACTED_PREFIX = f"{EVENT_PREFIX}compacted_"
+LEGACY_COMPACTED_PREFIX = "compacted_"  # local-only merged segments of earlier versions
+SYNC_STATE_FILENAME = "sync_state.json"
+COMPACTION_THRESHOLD = 50  # uploaded segments before they are merged locally
+ROW_GROUP_SIZE = 1024  # rows per Parquet row group, the unit of a lookup
+HISTORY_CACHE_SIZE = 256  # probes whose history is kept in memory
+CHANGE_LOG_SIZE = 1024  # recent changes kept for incremental consumers
+
+# Calibration standards offered by the calibration forms
+PH_BUFFERS = ["pH 7", "pH 4", "pH 10"]
+DO_STANDARDS = ["0% DO Calibration", "100% DO Calibration"]
+EC_STANDARDS = ["84 μS/cm", "1413 μS/cm", "12.88 mS/cm"]
+
+# One row per standard measured in a calibration, in column order
+EVENT_TEXT_COLUMNS = ["Serial Number", "Probe Type", "Standard", "Unit", "Control Number"]
+EVENT_DATE_COLUMNS = ["Calibration Date", "Expiration Date", "Date Opened", "Recorded At"]
+EVENT_NUMBER_COLUMNS = ["Initial", "Calibrated", "Initial mV", "Calibrated mV"]
+MV_COLUMNS = ["Initial mV", "Calibrated mV"]
+CALIBRATION_COLUMNS = [
+    "Serial Number", "Calibration Date", "Probe Type", "Standard", "Unit",
+    "Control Number", "Expiration Date", "Date Opened",
+    "Initial", "Calibrated", "Initial mV", "Calibrated mV", "Recorded At"
+]
+EVENT_KEY = ["Serial Number", "Calibration Date", "Standard"]
+
+# Calibration form field suffix -> event column
+FORM_FIELDS = {
+    "control": "Control Number",
+    "exp": "Expiration Date",
+    "opened": "Date Opened",
+    "initial": "Initial",
+    "calibrated": "Calibrated",
+    "initial_mv": "Initial mV",
+    "calibrated_mv": "Calibrated mV",
+}
+ORP_FIELDS = {
+    "control_number": "Control Number",
+    "expiration": "Expiration Date",
+    "date_opened": "Date Opened",
+    "initial": "Initial",
+    "calibrated": "Calibrated",
+}
+
+
+def apply_event_schema(df):
+    """Return df with the calibration event columns and dtypes"""
+    df = df.copy()
+    for column in CALIBRATION_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+    for column in EVENT_DATE_COLUMNS:
+        df[column] = pd.to_datetime(df[column], errors='coerce').astype('datetime64[ns]')
+    for column in EVENT_NUMBER_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    for column in EVENT_TEXT_COLUMNS:
+        df[column] = df[column].astype(str).astype(object).where(df[column].notna(), None)
+    return df[CALIBRATION_COLUMNS]
+
+
+def _read_event_csv(path, **kwargs):
+    """Read an event CSV keeping text columns (e.g. serials like "0456") verbatim"""
+    return pd.read_csv(
+        path,
+        dtype={column: str for column in EVENT_TEXT_COLUMNS},
+        keep_default_na=False,
+        na_values=[''],
+        **kwargs
+    )
+
+
+def _form_standards(probe_type, form_data):
+    """(standard, unit, {event column: value}) for each standard in a form submission"""
+    def fields(prefix, mapping):
+        return {
+            column: form_data[f"{prefix}{suffix}"]
+            for suffix, column in mapping.items()
+            if f"{prefix}{suffix}" in form_data
+        }
+
+    if probe_type == "pH Probe":
+        for label in PH_BUFFERS:
+            yield label, "pH", fields(f"{label}_", FORM_FIELDS)
+    elif probe_type == "DO Probe":
+        yield "Temperature", "°C", fields("temp_", FORM_FIELDS)
+        for idx, label in enumerate(DO_STANDARDS):
+            yield label, "%", fields(f"do_{idx}_", FORM_FIELDS)
+    elif probe_type == "ORP Probe":
+        yield "ORP", "mV", fields("", ORP_FIELDS)
+    elif probe_type == "EC Probe":
+        for idx, label in enumerate(EC_STANDARDS):
+            yield label, label.split(" ", 1)[1], fields(f"ec_{idx}_", FORM_FIELDS)
+
+
+def calibration_records(serial_number, probe_type, calibration_date, form_data):
+    """Normalise one calibration form submission into typed event rows"""
+    recorded_at = pd.Timestamp.now()
+    rows = [
+        {
+            "Serial Number": serial_number,
+            "Calibration Date": calibration_date,
+            "Probe Type": probe_type,
+            "Standard": standard,
+            "Unit": unit,
+            "Recorded At": recorded_at,
+            **values
+        }
+        for standard, unit, values in _form_standards(probe_type, form_data)
+        if values
+    ]
+    records = apply_event_schema(pd.DataFrame(rows, columns=CALIBRATION_COLUMNS))
+    # The mV fields used to default to 0; a 0 reading means the field was left blank
+    for column in MV_COLUMNS:
+        records[column] = records[column].where(records[column] != 0)
+    return records
+
+
+def legacy_records(inventory_df):
+    """Event rows for probes that still carry a JSON 'Calibration Data' blob"""
+    if 'Calibration Data' not in inventory_df.columns:
+        return apply_event_schema(pd.DataFrame(columns=CALIBRATION_COLUMNS))
+    blob_text = inventory_df['Calibration Data'].fillna('').astype(str).str.strip()
+    blobs = inventory_df[~blob_text.isin(['', '{}'])]
+    frames = []
+    for serial, probe_type, blob, modified in zip(
+        blobs['Serial Number'], blobs['Type'], blobs['Calibration Data'], blobs['Last Modified']
+    ):
+        try:
+            form_data = json.loads(blob)
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping unreadable calibration data for {serial}")
+            continue
+        calibration_date = form_data.get('calibration_date') or modified
+        frames.append(calibration_records(serial, probe_type, calibration_date, form_data))
+    if not frames:
+        return apply_event_schema(pd.DataFrame(columns=CALIBRATION_COLUMNS))
+    return pd.concat(frames, ignore_index=True)
+
+
+class CalibrationHistory:
+    """Append-only calibration events, stored as columnar segments.
+
+    Each save writes a new immutable segment rather than rewriting anything,
+    and local segments are merged once there are enough of them. A probe's
+    history is an indexed lookup: a serial number -> (file, row group) index,
+    built from the Serial Number column alone, says which row groups to read,
+    and results are cached per probe. Re-recorded calibrations (same serial,
+    date and standard) resolve to the latest recording.
+    """
+
+    def __init__(self, directory=CALIBRATION_DIRECTORY):
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._locations = None  # serial -> [(path, row group)], built lazily
+        self._cache = OrderedDict()  # serial -> history DataFrame
+        self._changes = deque(maxlen=CHANGE_LOG_SIZE)  # (version, serials)
+        self.version = 0
+        self.synced = False
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, records):
+        """Write new event rows as a segment; returns the segment name"""
+        if records.empty:
+            return None
+        records = apply_event_schema(records)
+        name = f"{EVENT_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}{self._extension()}"
+        with self._lock:
+            path = os.path.join(self.directory, name)
+            self._write_segment(records, path)
+            self._record_change(self._add_to_index(path))
+        logger.info(f"Recorded {len(records)} calibration events in {name}")
+        self.compact_if_needed()
+        return name
+
+    def history(self, serial_number):
+        """All calibration events for one probe, newest first"""
+        with self._lock:
+            cached = self._cache.get(serial_number)
+            if cached is not None:
+                self._cache.move_to_end(serial_number)
+                return cached.copy()
+
+            frames = [
+                chunk[chunk['Serial Number'] == serial_number]
+                for chunk in self._read_locations(self._index().get(serial_number, []))
+            ]
+            events = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CALIBRATION_COLUMNS)
+            events = apply_event_schema(events)
+            events = (
+                events.sort_values('Recorded At', kind='stable')
+                .drop_duplicates(subset=EVENT_KEY, keep='last')
+                .sort_values(['Calibration Date', 'Standard'], ascending=[False, True], kind='stable')
+                .reset_index(drop=True)
+            )
+            self._cache[serial_number] = events
+            while len(self._cache) > HISTORY_CACHE_SIZE:
+                self._cache.popitem(last=False)
+            return events.copy()
+
+    def latest(self, serial_number):
+        """Events of the probe's most recent calibration"""
+        events = self.history(serial_number)
+        if events.empty:
+            return events
+        return events[events['Calibration Date'] == events['Calibration Date'].iloc[0]].reset_index(drop=True)
+
+    def changes_since(self, version):
+        """(current version, serial numbers whose history changed since version).
+
+        The serials are None when the change log no longer reaches back that
+        far, meaning anything may have changed.
+        """
+        with self._lock:
+            if version == self.version:
+                return self.version, set()
+            changes = [serials for changed, serials in self._changes if changed > version]
+            if len(changes) != self.version - version:
+                return self.version, None
+            return self.version, set().union(*changes)
+
+    def has_history(self, serial_number):
+        with self._lock:
+            return serial_number in self._index()
+
+    def all_events(self):
+        """Every event, for analytics over the whole fleet"""
+        with self._lock:
+            frames = [self._read_segment(path) for path in self._segment_paths()]
+        if not frames:
+            return apply_event_schema(pd.DataFrame(columns=CALIBRATION_COLUMNS))
+        events = apply_event_schema(pd.concat(frames, ignore_index=True))
+        return events.sort_values('Recorded At', kind='stable').drop_duplicates(subset=EVENT_KEY, keep='last')
+
+    def migrate_legacy(self, records):
+        """Store event rows converted from JSON 'Calibration Data' blobs.
+
+        Returns the migrated serial numbers, so the caller can clear their
+        blobs from the inventory.
+        """
+        if records.empty:
+            return []
+        migrated = sorted(set(records['Serial Number']))
+        self.append(records)
+        logger.info(f"Migrated legacy calibration data for {len(migrated)} probes")
+        return migrated
+
+    def compact_if_needed(self):
+        """Merge segments once enough are safely on Drive; unsynced ones are kept"""
+        with self._lock:
+            uploaded = self._sync_state()['uploaded']
+            segments = [
+                name for name in os.listdir(self.directory)
+                if name.startswith(EVENT_PREFIX) and not name.startswith(COMPACTED_PREFIX) and name in uploaded
+            ]
+            if len(segments) < COMPACTION_THRESHOLD:
+                return False
+            return self._compact(segments)
+
+    def sync(self, drive_manager, folder_id):
+        """Exchange segments with Drive, then compact once enough are safely there"""
+        try:
+            self._exchange(drive_manager, folder_id)
+            self.synced = True
+            if self.compact_if_needed():
+                # Publish the merged segment and retire its sources straight away
+                self._exchange(drive_manager, folder_id)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to sync calibration history: {str(e)}")
+            return False
+
+    def _exchange(self, drive_manager, folder_id):
+        """Upload local segments Drive lacks, download segments other instances
+        wrote, and trash Drive segments that a compacted segment now covers"""
+        remote = {file['name']: file['id'] for file in drive_manager.list_files_with_prefix(folder_id, EVENT_PREFIX)}
+        with self._lock:
+            state = self._sync_state()
+            names = [name for name in os.listdir(self.directory) if not name.endswith('.tmp')]
+            local = {name for name in names if name.startswith(EVENT_PREFIX)}
+            complete = not any(name.startswith(LEGACY_COMPACTED_PREFIX) for name in names)
+            known = local | state['compacted']
+
+        uploaded = set(remote) & local
+        # Uploaded segments missing from Drive were merged by another instance
+        for name in sorted(local - set(remote) - state['uploaded']):
+            if drive_manager.upload_file(os.path.join(self.directory, name), folder_id, self._mimetype(name)):
+                uploaded.add(name)
+            else:
+                complete = False
+
+        downloaded = 0
+        for name in sorted(set(remote) - known):
+            content = drive_manager.download_file(remote[name])
+            with self._lock:
+                path = os.path.join(self.directory, name)
+                with open(f"{path}.tmp", 'wb') as f:
+                    f.write(content)
+                os.replace(f"{path}.tmp", path)
+                self._record_change(self._add_to_index(path))
+            uploaded.add(name)
+            downloaded += 1
+
+        # Merged sources leave Drive only once every local segment is on it
+        retired = state['compacted'] & set(remote) if complete else set()
+        if retired:
+            drive_manager.trash_files(remote[name] for name in sorted(retired))
+            logger.info(f"Trashed {len(retired)} compacted calibration event segments on Drive")
+
+        with self._lock:
+            state = self._sync_state()
+            state['uploaded'] |= uploaded
+            state['compacted'] &= (set(remote) | uploaded) - retired
+            self._write_sync_state(state)
+        if downloaded:
+            logger.info(f"Downloaded {downloaded} calibration event segments from Drive")
+
+    def _compact(self, segments):
+        """Merge local segments into one file sorted by serial number"""
+        frames = [self._read_segment(os.path.join(self.directory, name)) for name in segments]
+        compacted_files = [
+            name for name in os.listdir(self.directory)
+            if name.startswith((COMPACTED_PREFIX, LEGACY_COMPACTED_PREFIX)) and not name.endswith('.tmp')
+        ]
+        frames += [self._read_segment(os.path.join(self.directory, name)) for name in compacted_files]
+        merged = apply_event_schema(pd.concat(frames, ignore_index=True)).sort_values(
+            ['Serial Number', 'Recorded At'], kind='stable'
+        )
+        name = f"{COMPACTED_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{uuid.uuid4().hex[:8]}{self._extension()}"
+        self._write_segment(merged, os.path.join(self.directory, name))
+
+        # Remember merged segment names so sync does not fetch them again,
+        # and trashes their Drive copies once the merged segment is uploaded
+        state = self._sync_state()
+        state['compacted'] |= set(segments + compacted_files)
+        state['uploaded'] -= set(segments + compacted_files)
+        self._write_sync_state(state)
+        for old in segments + compacted_files:
+            os.remove(os.path.join(self.directory, old))
+        self._locations = None
+        logger.info(f"Compacted {len(segments)} calibration event segments")
+        return True
+
+    def _index(self):
+        if self._locations is None:
+            self._locations = {}
+            for path in self._segment_paths():
+                self._add_to_index(path)
+        return self._locations
+
+    def _add_to_index(self, path):
+        """Index a new segment and return the serial numbers it contains"""
+        pairs = list(self._row_group_serials(path))
+        if self._locations is not None:
+            for serial, row_group in pairs:
+                locations = self._locations.setdefault(serial, [])
+                if (path, row_group) not in locations:
+                    locations.append((path, row_group))
+        return {serial for serial, _ in pairs}
+
+    def _record_change(self, serials):
+        for serial in serials:
+            self._cache.pop(serial, None)
+        self.version += 1
+        self._changes.append((self.version, frozenset(serials)))
+
+    def _row_group_serials(self, path):
+        """(serial, row group) pairs, reading only the Serial Number column"""
+        if path.endswith('.parquet'):
+            parquet_file = pq.ParquetFile(path)
+            for row_group in range(parquet_file.num_row_groups):
+                serials = parquet_file.read_row_group(row_group, columns=['Serial Number']).column(0)
+                for serial in set(serials.to_pylist()):
+                    yield serial, row_group
+        else:
+            for serial in set(_read_event_csv(path, usecols=['Serial Number'])['Serial Number']):
+                yield serial, None
+
+    def _read_locations(self, locations):
+        by_path = OrderedDict()
+        for path, row_group in locations:
+            by_path.setdefault(path, []).append(row_group)
+        for path, row_groups in by_path.items():
+            if path.endswith('.parquet') and None not in row_groups:
+                yield pq.ParquetFile(path).read_row_groups(sorted(set(row_groups))).to_pandas()
+            else:
+                yield self._read_segment(path)
+
+    def _segment_paths(self):
+        return [
+            os.path.join(self.directory, name)
+            for name in sorted(os.listdir(self.directory))
+            if name.startswith((EVENT_PREFIX, LEGACY_COMPACTED_PREFIX)) and not name.endswith('.tmp')
+        ]
+
+    def _extension(self):
+        return ".parquet" if PARQUET_AVAILABLE else ".csv"
+
+    def _mimetype(self, name):
+        return PARQUET_MIMETYPE if name.endswith('.parquet') else "text/csv"
+
+    def _write_segment(self, df, path):
+        temp_path = f"{path}.tmp"
+        if path.endswith('.parquet'):
+            df.to_parquet(temp_path, index=False, row_group_size=ROW_GROUP_SIZE)
+        else:
+            df.to_csv(temp_path, index=False)
+        os.replace(temp_path, path)
+
+    def _read_segment(self, path):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path)
+        return apply_event_schema(_read_event_csv(path))
+
+    def _sync_state(self):
+        """Segment names known to be on Drive, and names merged into a compacted file"""
+        path = os.path.join(self.directory, SYNC_STATE_FILENAME)
+        state = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+        return {key: set(state.get(key, [])) for key in ('uploaded', 'compacted')}
+
+    def _write_sync_state(self, state):
+        path = os.path.join(self.directory, SYNC_STATE_FILENAME)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump({key: sorted(names) for key, names in state.items()}, f)
+        os.replace(f"{path}.tmp", path)
+
+
+@st.cache_resource
+def get_calibration_history():
+    """Get the calibration history store for this server process"""
+    return CalibrationHistory()
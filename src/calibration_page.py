@@ -3,49 +3,28 @@ import pandas as pd
 from datetime import datetime, timedelta, date
 import logging
 import time
-import json
 from .inventory_manager import BACKUP_FOLDER_ID
 from .drive_manager import DriveManager
-from .inventory_manager import save_inventory, STATUS_COLORS
+from .inventory_manager import (
+    initialize_inventory,
+    queue_inventory_save,
+    get_write_queue,
+    get_probe_search_index,
+    find_probe,
+    apply_probe_updates,
+    STATUS_COLORS
+)
+from .inventory_storage import format_date
+from .calibration_history import calibration_records, get_calibration_history
+from .inventory_review import display_calibration_details
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def convert_dates_to_strings(data):
-    """Convert all date objects in calibration data to string format."""
-    converted_data = {}
-    for key, value in data.items():
-        if isinstance(value, date):  
-            converted_data[key] = value.strftime("%Y-%m-%d")
-        else:
-            converted_data[key] = value
-    return converted_data
-
-def get_searchable_probes():
-    """Get list of searchable probes with their details for autocomplete"""
-    if 'inventory' not in st.session_state:
-        return []
-    
-    inventory_df = st.session_state.inventory
-    searchable_probes = []
-    
-    for _, row in inventory_df.iterrows():
-        probe_info = {
-            'serial': row['Serial Number'],
-            'type': row['Type'],
-            'manufacturer': row['Manufacturer'],
-            'status': row['Status'],
-            'display': f"{row['Serial Number']} - {row['Type']} ({row['Status']})",
-            'search_text': f"{row['Serial Number']} {row['Type']} {row['Manufacturer']} {row['Status']}"
-        }
-        searchable_probes.append(probe_info)
-    
-    return searchable_probes
-
 def render_autocomplete_search():
     """Render autocomplete search bar for probes with real-time suggestions"""
-    probes = get_searchable_probes()
+    search_index = get_probe_search_index()
     
     # Create a container for the search section
     search_container = st.container()
@@ -114,16 +93,13 @@ def render_autocomplete_search():
         st.session_state.search_query = search_query
         
         # Filter probes based on search query
-        if search_query:
-            filtered_probes = [
-                probe for probe in probes
-                if search_query.lower() in probe['search_text'].lower()
-            ]
+        if search_query and search_index is not None:
+            filtered_probes = search_index.search(search_query, limit=5)
             
             # Show suggestions
             if filtered_probes:
                 st.markdown("#### Matching Probes")
-                for probe in filtered_probes[:5]:  # Limit to 5 suggestions
+                for probe in filtered_probes:
                     status_color = {
                         'Instock': '#90EE90',
                         'Calibrated': '#98FB98',
@@ -177,7 +153,7 @@ def render_ph_calibration():
             
             ph_data[f"{buffer_label}_initial"] = st.number_input(f"{buffer_label} Initial Measurement (pH)", value=0.0, key=f"ph_{idx}_initial")
             ph_data[f"{buffer_label}_calibrated"] = st.number_input(f"{buffer_label} Calibrated Measurement (pH)", value=0.0, key=f"ph_{idx}_calibrated")
-            ph_data[f"{buffer_label}_initial_mv"] = st.number_input(f"{buffer_label} Initial mV", value=0.0, key=f"ph_{idx}_initial_mv")
+            ph_data[f"{buffer_label}_initial_mv"] = st.number_input(f"{buffer_label} Initial mV", value=None, key=f"ph_{idx}_initial_mv")
         st.markdown('</div>', unsafe_allow_html=True)
     return ph_data
 
@@ -256,87 +232,44 @@ def render_calibration_form(probe_type):
         return render_ec_calibration()
     return {}
 
-def find_probe(serial_number):
-    """Find a probe in the inventory by serial number."""
-    if 'inventory' not in st.session_state:
-        return None
-    
-    inventory_df = st.session_state.inventory
-    probe = inventory_df[inventory_df['Serial Number'] == serial_number]
-    return probe.iloc[0] if not probe.empty else None
-
-
 def update_probe_calibration(serial_number, calibration_data):
-    """Update probe calibration data in the inventory."""
+    """Record a calibration in the history and mark the probe calibrated."""
     try:
-        st.write("Debug: Starting calibration save...")
-        st.write(f"Debug: Serial Number: {serial_number}")
-        st.write(f"Debug: Original calibration data: {calibration_data}")
-        
-        inventory_df = st.session_state.inventory
-        st.write(f"Debug: Found inventory with {len(inventory_df)} records")
-        
-        # Check if serial number exists
-        if serial_number not in inventory_df['Serial Number'].values:
+        probe = find_probe(serial_number)
+        if probe is None:
             st.error(f"Serial number {serial_number} not found in inventory")
             return False
-            
-        probe_idx = inventory_df[inventory_df['Serial Number'] == serial_number].index[0]
-        st.write(f"Debug: Found probe at index {probe_idx}")
-        
-        # Convert dates to strings before JSON serialization
-        try:
-            converted_data = convert_dates_to_strings(calibration_data)
-            st.write(f"Debug: Converted data: {converted_data}")
-            json_data = json.dumps(converted_data)
-            st.write("Debug: Successfully converted calibration data to JSON")
-        except Exception as json_error:
-            st.error(f"Failed to convert calibration data to JSON: {str(json_error)}")
-            st.write(f"Debug: JSON conversion error details: {type(json_error).__name__}: {str(json_error)}")
-            return False
-        
-        try:
-            inventory_df.at[probe_idx, 'Calibration Data'] = json_data
-            inventory_df.at[probe_idx, 'Last Modified'] = datetime.now().strftime("%Y-%m-%d")
-            inventory_df.at[probe_idx, 'Next Calibration'] = (datetime.now() + timedelta(days=365)).strftime("%Y-%m-%d")
-            inventory_df.at[probe_idx, 'Status'] = "Calibrated"
-            st.write("Debug: Successfully updated DataFrame")
-        except Exception as df_error:
-            st.error(f"Failed to update DataFrame: {str(df_error)}")
+
+        records = calibration_records(
+            serial_number, probe['Type'], calibration_data['calibration_date'], calibration_data
+        )
+        if records.empty:
+            st.error("No calibration readings were entered")
             return False
-        
-        # Update session state
-        st.session_state.inventory = inventory_df
-        st.write("Debug: Updated session state inventory")
-        
-        # Try to save locally
-        save_success = save_inventory(st.session_state.inventory)
-        st.write(f"Debug: Local save result: {save_success}")
-        
-        # Try to save to Google Drive
-        if save_success and 'drive_manager' in st.session_state and 'drive_folder_id' in st.session_state:
-            st.write("Debug: Attempting Google Drive save")
-            drive_success = st.session_state.drive_manager.save_to_drive(
-                st.session_state.inventory,
-                st.session_state.get('drive_folder_id', BACKUP_FOLDER_ID)
-            )
-            st.write(f"Debug: Google Drive save result: {drive_success}")
-            
-            if drive_success:
-                st.session_state['last_save_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                return True
-            
-        return save_success
-    
+        get_calibration_history().append(records)
+
+        apply_probe_updates([serial_number], {
+            'Last Modified': datetime.now(),
+            'Next Calibration': (datetime.now() + timedelta(days=365)).strftime("%Y-%m-%d"),
+            'Status': "Calibrated"
+        })
+
+        # Queue the save to local disk and Google Drive
+        queue_inventory_save()
+        return True
+
     except Exception as e:
+        logger.error(f"Error saving calibration for {serial_number}: {str(e)}")
         st.error(f"Unexpected error: {str(e)}")
-        st.write(f"Debug: Error details: {type(e).__name__}: {str(e)}")
         return False
 
 def calibration_page():
     """Main page for probe calibration"""
     st.markdown('<h1 style="font-family: Arial; color: #0071ba;">🔍 Probe Calibration</h1>', unsafe_allow_html=True)
 
+    # Read the shared inventory
+    initialize_inventory()
+
     # Autocomplete search
     selected_serial = render_autocomplete_search()
     
@@ -357,17 +290,16 @@ def calibration_page():
         with col2:
             st.write(f"**Mfg P/N:** {probe['Mfg P/N']}")
             st.write(f"**Status:** {probe['Status']}")
-            st.write(f"**Entry Date:** {probe['Entry Date']}")
+            st.write(f"**Entry Date:** {format_date(probe['Entry Date'])}")
         
         # Check probe status
         if probe['Status'] in ['Calibrated', 'Shipped']:
-            st.warning(f"⚠️ This probe was already calibrated on {probe['Last Modified']} " +
+            st.warning(f"⚠️ This probe was already calibrated on {format_date(probe['Last Modified'])} " +
                       f"and is currently {probe['Status']}. No further calibration is allowed.")
             
             # Display existing calibration data in read-only mode
-            if 'Calibration Data' in probe and probe['Calibration Data']:
-                st.markdown("### Previous Calibration Data")
-                populate_calibration_form(probe['Type'], probe['Calibration Data'])
+            st.markdown("### Previous Calibration Data")
+            display_calibration_details(probe)
                 
         elif probe['Status'] != 'Instock':
             st.error("❌ Only probes with 'Instock' status can be calibrated.")
@@ -390,8 +322,8 @@ def calibration_page():
                         
                         # Show save status
                         if 'drive_manager' in st.session_state:
-                            st.success("✅ Inventory updated in Google Drive")
-                            st.success(f"Last saved: {st.session_state.get('last_save_time', 'Unknown')}")
+                            st.success("✅ Inventory update queued for Google Drive")
+                            st.success(f"Last saved: {get_write_queue().last_flush_time or 'Pending'}")
                         else:
                             st.warning("⚠️ Google Drive not configured. Data saved locally only.")
                         
@@ -1,12 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from datetime import datetime, timedelta
 from .drive_manager import DriveManager
-from .inventory_manager import initialize_inventory, save_inventory
-
-# Initialize inventory in session state
-initialize_inventory()
+from .inventory_manager import date_column_config, sync_with_drive
+from .inventory_storage import INVENTORY_COLUMNS, apply_schema
+from .dashboard_metrics import get_dashboard_summary, get_filtered_view
+from .inventory_store import get_inventory_store
+from .export_service import EXPORT_FORMATS, get_export_service, export_file_name, export_mime
+from .calibration_analytics import get_calibration_analytics, latest_per_probe, fleet_drift
 
 def load_data():
     """Fetch and preprocess inventory data."""
@@ -14,14 +15,63 @@ def load_data():
         return st.session_state.inventory
     else:
         st.warning("⚠️ No inventory data found.")
-        return pd.DataFrame(columns=[
-            "Serial Number", "Type", "Manufacturer", "KETOS P/N",
-            "Mfg P/N", "Next Calibration", "Status", "Entry Date",
-            "Last Modified", "Change Date"
-        ])
+        return apply_schema(pd.DataFrame(columns=INVENTORY_COLUMNS))
+
+def render_calibration_drift(px):
+    """Show calibration slope, offset and drift analytics for the fleet."""
+    st.markdown("### Calibration Drift")
+    summary = get_calibration_analytics().summary()
+    if summary.empty:
+        st.info("No calibrations recorded yet.")
+        return
+
+    latest = latest_per_probe(summary)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Calibrated Probes", len(latest))
+    with col2:
+        st.metric("Flagged Probes", int(latest['Flagged'].sum()))
+    with col3:
+        median_slope = latest['Slope %'].median()
+        st.metric("Median pH Slope", "N/A" if pd.isna(median_slope) else f"{median_slope:.1f}%")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        drift_chart = px.box(
+            summary.dropna(subset=['Drift per Day']),
+            x='Probe Type',
+            y='Drift per Day',
+            points='outliers',
+            title="Reading Drift per Day by Type"
+        )
+        st.plotly_chart(drift_chart, use_container_width=True)
+    with col2:
+        slope_chart = px.scatter(
+            latest.dropna(subset=['Slope %']),
+            x='Slope %',
+            y='Offset (mV)',
+            color='Flagged',
+            hover_name='Serial Number',
+            title="pH Slope vs Offset (Latest Calibration)"
+        )
+        st.plotly_chart(slope_chart, use_container_width=True)
+
+    flagged = latest[latest['Flagged']]
+    with st.expander(f"Flagged Probes ({len(flagged)})"):
+        st.dataframe(
+            flagged.drop(columns=['Flagged']),
+            use_container_width=True,
+            hide_index=True,
+            column_config={"Calibration Date": st.column_config.DateColumn("Calibration Date", format="YYYY-MM-DD")}
+        )
+    with st.expander("Drift by Probe Type"):
+        st.dataframe(fleet_drift(summary), use_container_width=True)
 
 def render_dashboard():
     """Render the dynamic dashboard."""
+    # plotly is only needed here, so it loads when the Dashboard is first opened
+    import plotly.express as px
+
     st.title("📊 Inventory Dashboard")
     inventory = load_data()
 
@@ -29,32 +79,33 @@ def render_dashboard():
         st.info("No data available. Add probes to the inventory to populate the dashboard.")
         return
 
+    summary = get_dashboard_summary(inventory)
+
     # Summary Section
     st.markdown("### Summary")
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Total Probes", len(inventory))
+        st.metric("Total Probes", summary['total'])
     with col2:
-        calibration_due = len(inventory[inventory['Next Calibration'] <= datetime.now().strftime('%Y-%m-%d')])
-        st.metric("Calibration Due", calibration_due)
+        st.metric("Calibration Due", summary['due'])
     with col3:
-        st.metric("Instock Probes", len(inventory[inventory['Status'] == 'Instock']))
+        st.metric("Instock Probes", summary['instock'])
+
+    with st.expander("Calibration Schedule by Type"):
+        st.dataframe(summary['schedule'], use_container_width=True)
 
     # Filters
     st.markdown("### Filters")
     col1, col2, col3 = st.columns(3)
     with col1:
-        probe_type = st.multiselect("Probe Type", inventory['Type'].unique(), default=inventory['Type'].unique())
+        probe_type = st.multiselect("Probe Type", summary['types'], default=summary['types'])
     with col2:
-        status_filter = st.multiselect("Status", inventory['Status'].unique(), default=inventory['Status'].unique())
+        status_filter = st.multiselect("Status", summary['statuses'], default=summary['statuses'])
     with col3:
         date_filter = st.date_input("Calibration Before", datetime.now() + timedelta(days=30))
 
-    filtered_inventory = inventory[
-        (inventory['Type'].isin(probe_type)) &
-        (inventory['Status'].isin(status_filter)) &
-        (pd.to_datetime(inventory['Next Calibration']) <= pd.to_datetime(date_filter))
-    ]
+    view = get_filtered_view(inventory, probe_type, status_filter, date_filter)
+    filtered_inventory = view['inventory']
 
     # Charts Section
     st.markdown("### Visualizations")
@@ -62,7 +113,7 @@ def render_dashboard():
 
     with col1:
         probe_count_chart = px.bar(
-            filtered_inventory.groupby('Type')['Serial Number'].count().reset_index(),
+            view['by_type'],
             x='Type',
             y='Serial Number',
             title="Probes by Type",
@@ -72,16 +123,19 @@ def render_dashboard():
 
     with col2:
         status_chart = px.pie(
-            filtered_inventory,
+            view['by_status'],
             names='Status',
+            values='Count',
             title="Probes by Status",
             hole=0.4
         )
         st.plotly_chart(status_chart, use_container_width=True)
 
+    render_calibration_drift(px)
+
     # Table Section
     st.markdown("### Inventory Table")
-    st.dataframe(filtered_inventory, use_container_width=True)
+    st.dataframe(filtered_inventory, use_container_width=True, column_config=date_column_config())
 
     # Action Section
     st.markdown("### Actions")
@@ -92,7 +146,7 @@ def render_dashboard():
             drive_manager = st.session_state.get("drive_manager")
             folder_id = st.session_state.get("drive_folder_id")
             if drive_manager and folder_id:
-                if drive_manager.save_to_drive(inventory, folder_id):
+                if sync_with_drive(drive_manager, folder_id):
                     st.success("✅ Inventory synced successfully with Google Drive!")
                 else:
                     st.error("⚠️ Failed to sync inventory with Google Drive.")
@@ -100,13 +154,15 @@ def render_dashboard():
                 st.warning("⚠️ Google Drive not configured.")
 
     with col2:
-        csv = filtered_inventory.to_csv(index=False).encode("utf-8")
+        # Serialized only when clicked, then cached per (version, filters, format)
+        file_format = st.selectbox("Export Format", list(EXPORT_FORMATS))
+        filter_key = (tuple(sorted(probe_type)), tuple(sorted(status_filter)), str(date_filter))
         st.download_button(
             label="Download Filtered Inventory",
-            data=csv,
-            file_name=f"filtered_inventory_{datetime.now().strftime('%Y%m%d')}.csv",
-            mime="text/csv"
+            data=get_export_service().deferred(
+                filtered_inventory, get_inventory_store().version, 'dashboard', filter_key, file_format
+            ),
+            file_name=export_file_name(f"filtered_inventory_{datetime.now().strftime('%Y%m%d')}", file_format),
+            mime=export_mime(file_format)
         )
 
-# Run the dashboard
-render_dashboard()
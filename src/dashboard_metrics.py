@@ -0,0 +1,86 @@
+import pandas as pd
+import logging
+from functools import partial
+from .inventory_store import get_inventory_store
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Calibration due buckets, relative to today
+OVERDUE = "Overdue"
+DUE_SOON = "Due in 30 Days"
+DUE_LATER = "Due Later"
+NOT_SCHEDULED = "Not Scheduled"
+DUE_SOON_DAYS = 30
+
+
+def due_buckets(next_calibration, today):
+    """Classify Next Calibration dates into due buckets in one vectorized pass"""
+    buckets = pd.Series(DUE_LATER, index=next_calibration.index, dtype=object)
+    buckets[next_calibration <= today + pd.Timedelta(days=DUE_SOON_DAYS)] = DUE_SOON
+    buckets[next_calibration <= today] = OVERDUE
+    buckets[next_calibration.isna()] = NOT_SCHEDULED
+    return buckets
+
+
+def summarize(inventory_df, today):
+    """Per-version dashboard totals and per-(Type, Status, due bucket) counts"""
+    buckets = due_buckets(inventory_df['Next Calibration'], today)
+    counts = (
+        inventory_df.assign(**{'Due Bucket': buckets})
+        .groupby(['Type', 'Status', 'Due Bucket'], dropna=False)
+        .size()
+        .rename('Count')
+        .reset_index()
+    )
+    return {
+        'total': len(inventory_df),
+        'due': int((buckets == OVERDUE).sum()),
+        'instock': int((inventory_df['Status'] == 'Instock').sum()),
+        'types': list(inventory_df['Type'].unique()),
+        'statuses': list(inventory_df['Status'].unique()),
+        'counts': counts,
+        'schedule': counts.pivot_table(
+            index='Type', columns='Due Bucket', values='Count', aggfunc='sum', fill_value=0
+        ).reindex(columns=[OVERDUE, DUE_SOON, DUE_LATER, NOT_SCHEDULED], fill_value=0)
+    }
+
+
+def filter_view(inventory_df, types, statuses, before):
+    """Rows and chart counts for one combination of dashboard filters"""
+    mask = (
+        inventory_df['Type'].isin(types) &
+        inventory_df['Status'].isin(statuses) &
+        (inventory_df['Next Calibration'] <= before)
+    )
+    filtered = inventory_df[mask]
+    return {
+        'inventory': filtered,
+        'by_type': filtered.groupby('Type')['Serial Number'].count().reset_index(),
+        'by_status': filtered['Status'].value_counts(dropna=False).rename_axis('Status').reset_index(name='Count')
+    }
+
+
+def _filter_key(values):
+    """Order-independent, hashable form of a multiselect value"""
+    return tuple(sorted(set(values), key=str))
+
+
+def _derived(name, builder, inventory_df, key):
+    """Memoize on the shared store; fall back to computing on inventory_df"""
+    result = get_inventory_store().derived(name, builder, key=key)
+    return builder(inventory_df) if result is None else result
+
+
+def get_dashboard_summary(inventory_df):
+    """Dashboard totals for the current inventory version, computed once per day"""
+    today = pd.Timestamp.now().normalize()
+    return _derived('dashboard_summary', partial(summarize, today=today), inventory_df, today)
+
+
+def get_filtered_view(inventory_df, types, statuses, before):
+    """Filtered rows and chart counts, memoized on (version, filters)"""
+    types, statuses, before = _filter_key(types), _filter_key(statuses), pd.Timestamp(before)
+    builder = partial(filter_view, types=list(types), statuses=list(statuses), before=before)
+    return _derived('dashboard_view', builder, inventory_df, (types, statuses, before))
@@ -1,31 +1,111 @@
 import streamlit as st
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload, MediaIoBaseDownload
+from googleapiclient.http import MediaIoBaseUpload
 from googleapiclient.errors import HttpError
 import pandas as pd
 import io
+import uuid
+import time
 import os
+import random
+import threading
 import logging
+from collections import OrderedDict
 from datetime import datetime
+from .inventory_storage import (
+    PARQUET_AVAILABLE,
+    PARQUET_MIMETYPE,
+    deserialize_inventory,
+    serialize_inventory,
+    storage_filename,
+    storage_mimetype
+)
+from .google_clients import get_google_clients
+from .inventory_merge import merge_inventories
+from .drive_transport import DriveTransport
+from .backup_manager import get_backup_manager
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 INVENTORY_FILENAME = "wbpms_inventory_2024.csv"
+INVENTORY_PREFIX = "wbpms_inventory"
+CHANGE_LOG_PREFIX = "wbpms_inventory_changes_"
+COMPACTION_THRESHOLD = 20
+FILE_ID_CACHE_TTL = 300  # seconds
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # bytes per resumable upload request
 BACKUP_FOLDER_ID = "19lHngxB_RXEpr30jpY9_fCaSpl6Z1m1i"
+SIGNATURE_FIELDS = "md5Checksum, modifiedTime, version"  # change whenever a file's content does
+MAX_WRITE_ATTEMPTS = 5  # optimistic rewrites of the main file before giving up
+# Total size of downloaded Drive files kept in memory, shared by every session
+DOWNLOAD_CACHE_BYTES = int(os.environ.get("INVENTORY_DOWNLOAD_CACHE_MB", 128)) * 1024 * 1024
+
+# Serializes main-file rewrites between sessions in this process; other
+# processes are caught by the Drive version check in save_to_drive
+_MAIN_FILE_LOCK = threading.RLock()
+
+
+class WriteConflict(Exception):
+    """The main inventory file changed on Drive while it was being rewritten"""
+
+
+class DownloadCache:
+    """Downloaded Drive files, parsed or raw, shared by every session.
+
+    Entries are keyed by (file ID, signature, kind), so a changed file is a
+    miss and its old entry simply ages out. Entries are evicted least
+    recently used once they exceed max_bytes in total, which also drops
+    change-log files trashed by another process.
+    """
+
+    def __init__(self, max_bytes=DOWNLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (file_id, signature, kind) -> (value, size)
+        self._size = 0
+
+    def get(self, file_id, signature, kind):
+        with self._lock:
+            entry = self._entries.get((file_id, signature, kind))
+            if entry is None:
+                return None
+            self._entries.move_to_end((file_id, signature, kind))
+            return entry[0]
+
+    def put(self, file_id, signature, kind, value):
+        size = len(value) if isinstance(value, bytes) else int(value.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            key = (file_id, signature, kind)
+            if key in self._entries:
+                self._size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+
+    def forget(self, file_id):
+        """Drop every cached version of a file"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_id]:
+                self._size -= self._entries.pop(key)[1]
+
 
 class DriveManager:
     def __init__(self):
         self.service = None
         self.credentials = None
+        self._file_ids = {}  # (folder_id, filename) -> (file_id, expires_at)
 
     def authenticate(self, credentials):
         """Set up Google Drive service with provided credentials"""
         try:
             self.credentials = credentials
-            self.service = build('drive', 'v3', credentials=credentials)
+            # Every call retries on throttling and is measured by the transport
+            self.service = DriveTransport(get_google_clients().service(credentials, 'drive', 'v3'))
             logger.info("Drive service authenticated successfully")
             return True
         except Exception as e:
@@ -33,6 +113,23 @@ class DriveManager:
             st.error(f"Drive authentication failed: {str(e)}")
             return False
 
+    def for_current_thread(self):
+        """A DriveManager for the calling background thread.
+
+        It shares this manager's credentials and caches but has its own HTTP
+        connection, so a worker never interleaves requests with the session
+        that submitted the work.
+        """
+        if self.credentials is None:
+            return self
+        manager = DriveManager()
+        manager.credentials = self.credentials
+        manager.service = DriveTransport(
+            get_google_clients().thread_service(self.credentials, 'drive', 'v3')
+        )
+        manager._file_ids = self._file_ids
+        return manager
+
     def verify_folder_access(self, folder_id):
         """Verify if the folder exists and is accessible"""
         try:
@@ -54,6 +151,11 @@ class DriveManager:
 
     def get_file_id(self, folder_id, filename):
         """Get file ID if it exists in the folder"""
+        key = (folder_id, filename)
+        cached = self._file_ids.get(key)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+
         try:
             query = f"name='{filename}' and '{folder_id}' in parents and trashed=false"
             results = self.service.files().list(
@@ -62,28 +164,191 @@ class DriveManager:
             ).execute()
             
             files = results.get('files', [])
-            return files[0]['id'] if files else None
+            if not files:
+                return None
+            self._remember_file_id(folder_id, filename, files[0]['id'])
+            return files[0]['id']
         except Exception as e:
             logger.error(f"Error getting file ID: {str(e)}")
             return None
 
+    def _remember_file_id(self, folder_id, filename, file_id):
+        self._file_ids[(folder_id, filename)] = (file_id, time.monotonic() + FILE_ID_CACHE_TTL)
+
+    def forget_file_id(self, file_id):
+        """Drop cached name lookups that resolve to file_id"""
+        for key, (cached_id, _) in list(self._file_ids.items()):
+            if cached_id == file_id:
+                self._file_ids.pop(key, None)
+        get_download_cache().forget(file_id)
+
+    def _with_file_id(self, folder_id, filename, action):
+        """Run action(file_id) on a named file, re-resolving once if the cached ID is gone.
+
+        Returns None when the file does not exist.
+        """
+        file_id = self.get_file_id(folder_id, filename)
+        if not file_id:
+            return None
+        try:
+            return action(file_id)
+        except HttpError as error:
+            if error.resp.status != 404:
+                raise
+            logger.info(f"Cached file ID for {filename} is stale, looking it up again")
+            self.forget_file_id(file_id)
+            file_id = self.get_file_id(folder_id, filename)
+            if not file_id:
+                return None
+            return action(file_id)
+
+    def _inventory_media(self, df, resumable=True, file_format=None):
+        """Serialize a DataFrame into an in-memory upload.
+
+        The primary format is Parquet when pyarrow is installed, CSV otherwise.
+        pandas writes into the buffer and the upload reads from that same
+        buffer, so only one serialized copy is held and nothing touches the
+        working directory.
+        """
+        file_format = file_format or ('parquet' if PARQUET_AVAILABLE else 'csv')
+        buffer = io.BytesIO()
+        serialize_inventory(df, buffer, file_format)
+        buffer.seek(0)
+        return MediaIoBaseUpload(
+            buffer,
+            mimetype=PARQUET_MIMETYPE if file_format == 'parquet' else 'text/csv',
+            chunksize=UPLOAD_CHUNK_SIZE,
+            resumable=resumable
+        )
+
+    def get_inventory_revision(self, folder_id):
+        """Return a token that changes whenever the inventory or its change log changes"""
+        try:
+            if not self.service:
+                logger.error("Drive service not initialized")
+                return None
+
+            query = f"name contains '{INVENTORY_PREFIX}' and '{folder_id}' in parents and trashed=false"
+            results = self.service.files().list(
+                q=query,
+                fields="files(id, name, modifiedTime)"
+            ).execute()
+
+            files = results.get('files', [])
+            if not files:
+                return None
+            latest = max(f['modifiedTime'] for f in files)
+            return f"{latest}#{len(files)}"
+        except Exception as e:
+            logger.error(f"Error getting inventory revision: {str(e)}")
+            return None
+
+    def list_change_files(self, folder_id):
+        """List change-log files not yet compacted, oldest first"""
+        return self.list_files_with_prefix(folder_id, CHANGE_LOG_PREFIX)
+
+    def list_files_with_prefix(self, folder_id, prefix, first_page=None):
+        """List the folder's files whose names contain prefix, ordered by name.
+
+        first_page is an already fetched response to _list_request, e.g. from
+        a batch; the remaining pages are fetched here.
+        """
+        results = first_page if first_page is not None else self._list_request(folder_id, prefix).execute()
+        files = list(results.get('files', []))
+        while results.get('nextPageToken'):
+            results = self._list_request(folder_id, prefix, results['nextPageToken']).execute()
+            files.extend(results.get('files', []))
+        return files
+
+    def _list_request(self, folder_id, prefix, page_token=None):
+        return self.service.files().list(
+            q=f"name contains '{prefix}' and '{folder_id}' in parents and trashed=false",
+            orderBy='name',
+            fields="nextPageToken, files(id, name)",
+            pageToken=page_token
+        )
+
+    def _file_signature(self, file_id):
+        """Fetch the metadata that changes whenever a file's content changes"""
+        return _signature(self.service.files().get(fileId=file_id, fields=SIGNATURE_FIELDS).execute())
+
+    def _file_version(self, file_id):
+        """Drive's version counter for a file, bumped on every change"""
+        return self.service.files().get(fileId=file_id, fields="version").execute().get('version')
+
+    def _file_version_or_conflict(self, file_id, filename):
+        """Like _file_version, but a file that has vanished is a write conflict"""
+        try:
+            return self._file_version(file_id)
+        except HttpError as error:
+            if error.resp.status != 404:
+                raise
+            self.forget_file_id(file_id)
+            raise WriteConflict(f"{filename} was removed on Drive during save")
+
+    def _download_frame(self, file_id, filename, immutable=False, signature=None):
+        """Download an inventory file by ID and parse it, reusing the last parse if unchanged.
+
+        Immutable files (change-log entries) are never re-checked, and a
+        signature the caller already fetched is not fetched again.
+        """
+        if signature is None and not immutable:
+            signature = self._file_signature(file_id)
+        cached = get_download_cache().get(file_id, signature, 'frame')
+        if cached is not None:
+            logger.info(f"Drive file {file_id} unchanged, reusing parsed copy")
+            return cached.copy()
+
+        content = self.service.files().get_media(fileId=file_id).execute()
+        df = deserialize_inventory(content, filename)
+        get_download_cache().put(file_id, signature, 'frame', df)
+        return df.copy()
+
+    def _read_main_inventory(self, folder_id, signatures=None):
+        """Read the primary inventory file, falling back to the legacy CSV.
+
+        signatures maps file IDs to signatures the caller already fetched.
+        """
+        signatures = signatures or {}
+        for filename in dict.fromkeys([storage_filename(), INVENTORY_FILENAME]):
+            inventory_df = self._with_file_id(
+                folder_id,
+                filename,
+                lambda file_id: self._download_frame(file_id, filename, signature=signatures.get(file_id))
+            )
+            if inventory_df is not None:
+                return inventory_df
+        return None
+
+    def _read_inventory(self, folder_id, change_files, signatures=None):
+        """Read the main inventory file and replay the given change-log files on top"""
+        frames = []
+        inventory_df = self._read_main_inventory(folder_id, signatures)
+        if inventory_df is not None:
+            frames.append(inventory_df)
+        for change_file in change_files:
+            frames.append(self._download_frame(change_file['id'], change_file['name'], immutable=True))
+
+        if not frames:
+            return None
+        if len(frames) == 1:
+            return frames[0]
+        # Change files are oldest first, so later changes win ties
+        merged, _ = merge_inventories(frames[0], pd.concat(frames[1:], ignore_index=True))
+        return merged
+
     def load_inventory_from_drive(self, folder_id):
-        """Load inventory file from Drive"""
+        """Load inventory file from Drive, including changes not yet compacted"""
         try:
             if not self.service:
                 logger.error("Drive service not initialized")
                 return None
 
-            file_id = self.get_file_id(folder_id, INVENTORY_FILENAME)
-            if not file_id:
+            df = self._read_inventory(folder_id, self.list_change_files(folder_id))
+            if df is None:
                 logger.info("No inventory file found in Drive")
                 return None
 
-            request = self.service.files().get_media(fileId=file_id)
-            content = request.execute()
-            
-            # Read CSV content
-            df = pd.read_csv(io.StringIO(content.decode('utf-8')))
             logger.info(f"Successfully loaded inventory from Drive: {len(df)} records")
             return df
 
@@ -91,125 +356,244 @@ class DriveManager:
             logger.error(f"Failed to load inventory from Drive: {str(e)}")
             return None
 
-    def save_to_drive(self, inventory_df, folder_id):
-        """Save or update inventory to Google Drive, appending new records."""
+    def save_changes(self, changes_df, folder_id):
+        """Append changed rows to the Drive change log instead of rewriting the inventory"""
         try:
             if not self.service:
                 logger.error("Drive service not initialized")
                 return False
 
-            # Load existing data
-            existing_inventory = self.load_inventory_from_drive(folder_id)
-
-            # Merge new data with existing inventory
-            if existing_inventory is not None:
-                inventory_df = pd.concat([existing_inventory, inventory_df]).drop_duplicates(
-                    subset="Serial Number", keep="last"
-                )
+            if changes_df.empty:
+                return True
 
-            # Save the merged inventory back to the drive
-            temp_file = INVENTORY_FILENAME
-            inventory_df.to_csv(temp_file, index=False)
+            # Timestamped names keep the change log ordered; the suffix keeps
+            # concurrent writers from colliding
+            timestamp = datetime.now().strftime('%Y%m%d%H%M%S%f')
+            change_filename = f"{CHANGE_LOG_PREFIX}{timestamp}_{uuid.uuid4().hex[:8]}.csv"
 
-            # Prepare file metadata and media
             file_metadata = {
-                'name': INVENTORY_FILENAME,
+                'name': change_filename,
+                'parents': [folder_id],
                 'mimeType': 'text/csv'
             }
 
-            media = MediaFileUpload(
-                temp_file,
-                mimetype='text/csv',
-                resumable=True
-            )
+            # Change-log entries are a handful of rows, where CSV is far
+            # smaller than Parquet's fixed footer; the schema is applied on read
+            media = self._inventory_media(changes_df, resumable=False, file_format='csv')
+
+            self.service.files().create(
+                body=file_metadata,
+                media_body=media,
+                fields='id'
+            ).execute()
 
-            # Check if file exists
-            file_id = self.get_file_id(folder_id, INVENTORY_FILENAME)
-
-            if file_id:
-                # Update existing file
-                self.service.files().update(
-                    fileId=file_id,
-                    media_body=media,
-                    fields='id'
-                ).execute()
-                logger.info("Updated existing inventory file in Drive")
-            else:
-                # Create new file
-                file_metadata['parents'] = [folder_id]
-                self.service.files().create(
-                    body=file_metadata,
-                    media_body=media,
-                    fields='id'
-                ).execute()
-                logger.info("Created new inventory file in Drive")
-
-            # Clean up temporary file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+            logger.info(f"Appended {len(changes_df)} changed records to {change_filename}")
+
+            # Fold the change log into the main file once it grows
+            if len(self.list_change_files(folder_id)) >= COMPACTION_THRESHOLD:
+                self.compact_changes(folder_id)
 
             return True
 
         except Exception as e:
-            logger.error(f"Failed to save to Drive: {str(e)}")
+            logger.error(f"Failed to save changes to Drive: {str(e)}")
             return False
 
-    def create_backup(self, inventory_df, folder_id):
-        """Create backup of inventory file"""
+    def compact_changes(self, folder_id):
+        """Merge the change log into the main inventory file"""
+        return self.save_to_drive(None, folder_id)
+
+    def save_to_drive(self, inventory_df, folder_id, serial_numbers=None):
+        """Save or update inventory to Google Drive, appending new records.
+
+        When serial_numbers is given only those rows are sent, as a change-log
+        entry. Otherwise the full inventory is merged per serial number by Last
+        Modified, rewritten if Drive's copy has not changed meanwhile (retrying
+        the merge if it has), and the change log is compacted into it.
+        """
         try:
-            timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-            backup_filename = f"inventory_backup_{timestamp}.csv"
-            
-            # Save DataFrame to temporary file
-            temp_file = backup_filename
-            inventory_df.to_csv(temp_file, index=False)
+            if not self.service:
+                logger.error("Drive service not initialized")
+                return False
 
-            # Prepare file metadata and media
-            file_metadata = {
-                'name': backup_filename,
-                'parents': [folder_id],
-                'mimeType': 'text/csv'
-            }
+            if serial_numbers is not None:
+                changes_df = inventory_df[inventory_df['Serial Number'].isin(serial_numbers)]
+                return self.save_changes(changes_df, folder_id)
+
+            with _MAIN_FILE_LOCK:
+                for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+                    try:
+                        change_files = self._rewrite_main_file(inventory_df, folder_id)
+                        break
+                    except WriteConflict as e:
+                        logger.warning(f"{str(e)}, merging and retrying ({attempt}/{MAX_WRITE_ATTEMPTS})")
+                        time.sleep(random.uniform(0, 0.5 * attempt))
+                else:
+                    logger.error("Gave up saving to Drive after repeated write conflicts")
+                    return False
+
+            # The change-log entries are now part of the main file
+            self.trash_files(change_file['id'] for change_file in change_files)
+            if change_files:
+                logger.info(f"Compacted {len(change_files)} change-log files")
 
-            media = MediaFileUpload(
-                temp_file,
-                mimetype='text/csv',
-                resumable=True
-            )
+            return True
 
-            # Create backup file
-            self.service.files().create(
-                body=file_metadata,
+        except Exception as e:
+            logger.error(f"Failed to save to Drive: {str(e)}")
+            return False
+
+    def _rewrite_main_file(self, inventory_df, folder_id):
+        """Merge inventory_df into Drive's inventory and upload it if Drive has not moved.
+
+        The main file's version is read before the merge and checked again just
+        before the upload; a mismatch raises WriteConflict so the caller can
+        re-read and merge again. Returns the change-log files folded in.
+
+        The main file's signature (which carries its version) and the
+        change-log listing are independent, so they go out as one batch.
+        """
+        filename = storage_filename()
+        file_id = self.get_file_id(folder_id, filename)
+        requests = [self._list_request(folder_id, CHANGE_LOG_PREFIX)]
+        if file_id:
+            requests.append(self.service.files().get(fileId=file_id, fields=SIGNATURE_FIELDS))
+        try:
+            results = self.service.batch(requests)
+        except HttpError as error:
+            if error.resp.status != 404 or not file_id:
+                raise
+            self.forget_file_id(file_id)
+            raise WriteConflict(f"{filename} was removed on Drive during save")
+
+        change_files = self.list_files_with_prefix(folder_id, CHANGE_LOG_PREFIX, first_page=results[0])
+        signatures = {file_id: _signature(results[1])} if file_id else {}
+        base_version = signatures[file_id][2] if file_id else None
+        existing_inventory = self._read_inventory(folder_id, change_files, signatures)
+
+        # Merge per serial number, keeping whichever copy was modified last
+        if inventory_df is None:
+            if existing_inventory is None:
+                return change_files
+            inventory_df = existing_inventory
+        elif existing_inventory is not None:
+            inventory_df, _ = merge_inventories(existing_inventory, inventory_df)
+
+        media = self._inventory_media(inventory_df)
+
+        if file_id:
+            if self._file_version_or_conflict(file_id, filename) != base_version:
+                raise WriteConflict(f"{filename} changed on Drive during save")
+            self.service.files().update(
+                fileId=file_id,
                 media_body=media,
                 fields='id'
             ).execute()
+            logger.info("Updated existing inventory file in Drive")
+        else:
+            # Someone may have created the file since it was looked up
+            if self.get_file_id(folder_id, filename):
+                raise WriteConflict(f"{filename} was created on Drive during save")
+            created = self.service.files().create(
+                body={
+                    'name': filename,
+                    'mimeType': storage_mimetype(),
+                    'parents': [folder_id]
+                },
+                media_body=media,
+                fields='id'
+            ).execute()
+            self._remember_file_id(folder_id, filename, created['id'])
+            logger.info("Created new inventory file in Drive")
 
-            # Clean up temporary file
-            if os.path.exists(temp_file):
-                os.remove(temp_file)
+        return change_files
 
-            logger.info(f"Created backup file: {backup_filename}")
+    def create_backup(self, inventory_df, folder_id):
+        """Back up the inventory to Drive unless it is unchanged since the last backup.
+
+        Backups are compressed snapshots managed by BackupManager, which also
+        thins old ones out of Drive according to its retention policy.
+        """
+        try:
+            manager = get_backup_manager()
+            entry = manager.snapshot(inventory_df)
+            if entry is None:
+                return True
+            if not manager.upload(entry, self, folder_id):
+                return False
+            manager.prune(self)
+            logger.info(f"Created backup file: {entry['name']}")
             return True
 
         except Exception as e:
             logger.error(f"Failed to create backup: {str(e)}")
             return False
 
+    def upload_file(self, path, folder_id, mimetype):
+        """Upload a local file to the folder and return its Drive ID"""
+        try:
+            with open(path, 'rb') as f:
+                media = MediaIoBaseUpload(
+                    io.BytesIO(f.read()),
+                    mimetype=mimetype,
+                    chunksize=UPLOAD_CHUNK_SIZE,
+                    resumable=True
+                )
+            created = self.service.files().create(
+                body={'name': os.path.basename(path), 'parents': [folder_id], 'mimeType': mimetype},
+                media_body=media,
+                fields='id'
+            ).execute()
+            return created['id']
+        except Exception as e:
+            logger.error(f"Failed to upload {path}: {str(e)}")
+            return None
+
+    def download_file(self, file_id):
+        """Download a file's content as bytes"""
+        return self.service.files().get_media(fileId=file_id).execute()
+
+    def trash_files(self, file_ids):
+        """Move files to the Drive trash in batched requests"""
+        file_ids = list(file_ids)
+        self.service.batch(
+            self.service.files().update(fileId=file_id, body={'trashed': True})
+            for file_id in file_ids
+        )
+        for file_id in file_ids:
+            self.forget_file_id(file_id)
+
     def download_inventory_csv(self, folder_id, file_name="wbpms_inventory_2024.csv"):
         """Download a CSV file from Google Drive."""
         try:
-            file_id = self.get_file_id(folder_id, file_name)
-            if not file_id:
+            file_content = self._with_file_id(folder_id, file_name, self._download_stream)
+            if file_content is None:
                 raise FileNotFoundError(f"File '{file_name}' not found in folder '{folder_id}'.")
-
-            request = self.service.files().get_media(fileId=file_id)
-            file_content = io.BytesIO()
-            downloader = MediaIoBaseDownload(file_content, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            file_content.seek(0)  # Reset the stream to the beginning
             return file_content
         except HttpError as error:
             logger.error(f"An error occurred while downloading the file: {error}")
             raise error
+
+    def _download_stream(self, file_id):
+        """Download a file by ID in chunks into an in-memory stream, skipping unchanged files"""
+        signature = self._file_signature(file_id)
+        cached = get_download_cache().get(file_id, signature, 'bytes')
+        if cached is not None:
+            return io.BytesIO(cached)
+
+        request = self.service.files().get_media(fileId=file_id)
+        file_content = io.BytesIO()
+        self.service.download(request, file_content)
+        get_download_cache().put(file_id, signature, 'bytes', file_content.getvalue())
+        file_content.seek(0)  # Reset the stream to the beginning
+        return file_content
+
+
+def _signature(metadata):
+    return (metadata.get('md5Checksum'), metadata.get('modifiedTime'), metadata.get('version'))
+
+
+@st.cache_resource
+def get_download_cache():
+    """Get the Drive download cache shared by every session"""
+    return DownloadCache()
@@ -0,0 +1,200 @@
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaIoBaseDownload
+import threading
+import random
+import time
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# 403s that mean "slow down" rather than "not allowed"
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+MAX_RETRIES = 5
+BASE_DELAY = 0.5  # seconds before the first retry
+MAX_DELAY = 32.0  # cap on a single backoff
+BATCH_SIZE = 100  # Drive's limit on calls per batch request
+
+
+def is_retryable(error):
+    """True for throttling and transient errors that are worth retrying"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRY_STATUSES:
+            return True
+        return status == 403 and any(reason in (error.content or b"") for reason in RATE_LIMIT_REASONS)
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class CallMetrics:
+    """Latency and error counters per Drive method, shared by every session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # method -> counters
+
+    def record(self, method, seconds, error=None, retries=0):
+        with self._lock:
+            counters = self._calls.setdefault(
+                method, {"calls": 0, "errors": 0, "retries": 0, "total": 0.0, "max": 0.0}
+            )
+            counters["calls"] += 1
+            counters["retries"] += retries
+            counters["total"] += seconds
+            counters["max"] = max(counters["max"], seconds)
+            if error is not None:
+                counters["errors"] += 1
+
+    def snapshot(self):
+        """Return per-method counters for display"""
+        with self._lock:
+            return {
+                method: {
+                    "Calls": counters["calls"],
+                    "Errors": counters["errors"],
+                    "Retries": counters["retries"],
+                    "Avg (ms)": round(counters["total"] / counters["calls"] * 1000, 1),
+                    "Max (ms)": round(counters["max"] * 1000, 1)
+                }
+                for method, counters in sorted(self._calls.items())
+            }
+
+
+DRIVE_METRICS = CallMetrics()
+
+
+class DriveTransport:
+    """Wraps a Drive service so every request retries and is measured.
+
+    Use it exactly like the service (``transport.files().get(...).execute()``);
+    throttling and transient errors are retried with full-jitter exponential
+    backoff, honouring Retry-After, before the error reaches the caller.
+    ``batch()`` sends independent requests as BatchHttpRequests.
+    """
+
+    def __init__(self, service, metrics=DRIVE_METRICS, max_retries=MAX_RETRIES,
+                 base_delay=BASE_DELAY, max_delay=MAX_DELAY, sleep=time.sleep):
+        self._service = service
+        self.metrics = metrics
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if name == "new_batch_http_request" or not callable(attr):
+            return attr
+        return lambda *args, **kwargs: _Resource(attr(*args, **kwargs), self)
+
+    def execute(self, request, method=None, **kwargs):
+        """Execute one request, retrying throttling and transient errors"""
+        method = method or _method_id(request)
+        return self._call(method, lambda: request.execute(**kwargs))
+
+    def download(self, request, fd):
+        """Download a media request into fd chunk by chunk; a retry resumes the chunk"""
+        downloader = MediaIoBaseDownload(fd, _unwrap(request))
+        done = False
+        while not done:
+            _, done = self._call(_method_id(request), downloader.next_chunk)
+
+    def batch(self, requests):
+        """Execute independent requests in batches and return their results in order.
+
+        Sub-requests that hit throttling or transient errors are retried in the
+        next batch; any other error is raised after the rest have run.
+        """
+        requests = list(requests)
+        if not hasattr(self._service, "new_batch_http_request"):
+            return [self.execute(request) for request in requests]
+
+        results = [None] * len(requests)
+        pending = list(range(len(requests)))
+        for attempt in range(self.max_retries + 1):
+            errors = {}
+            for start in range(0, len(pending), BATCH_SIZE):
+                self._execute_batch(requests, pending[start:start + BATCH_SIZE], results, errors)
+
+            retry = [index for index, error in errors.items() if is_retryable(error)]
+            fatal = [error for error in errors.values() if not is_retryable(error)]
+            if fatal:
+                raise fatal[0]
+            if not retry:
+                return results
+            if attempt < self.max_retries:
+                logger.warning(f"Retrying {len(retry)} throttled Drive batch calls")
+                self._sleep(self._backoff(attempt, errors[retry[0]]))
+            pending = sorted(retry)
+        raise errors[pending[0]]
+
+    def _execute_batch(self, requests, indexes, results, errors):
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                errors[index] = exception
+            else:
+                results[index] = response
+
+        batch = self._service.new_batch_http_request(callback=callback)
+        for index in indexes:
+            batch.add(_unwrap(requests[index]), request_id=str(index))
+        self._call("drive.batch", batch.execute)
+
+    def _call(self, method, action):
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = action()
+                self.metrics.record(method, time.monotonic() - start, retries=attempt)
+                return result
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    self.metrics.record(method, time.monotonic() - start, error=e, retries=attempt)
+                    raise
+                delay = self._backoff(attempt, e)
+                logger.warning(f"{method} failed ({str(e)}), retrying in {delay:.1f}s")
+                self._sleep(delay)
+
+    def _backoff(self, attempt, error):
+        """Full-jitter exponential backoff, or the server's Retry-After if given"""
+        retry_after = error.resp.get("retry-after") if isinstance(error, HttpError) else None
+        if retry_after and str(retry_after).isdigit():
+            return min(self.max_delay, float(retry_after))
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class _Resource:
+    """A service resource (e.g. files()) whose methods return retrying requests"""
+
+    def __init__(self, resource, transport):
+        self._resource = resource
+        self._transport = transport
+
+    def __getattr__(self, name):
+        method = getattr(self._resource, name)
+        return lambda *args, **kwargs: _Request(method(*args, **kwargs), self._transport)
+
+
+class _Request:
+    """A request whose execute() goes through the transport"""
+
+    def __init__(self, request, transport):
+        self.request = request
+        self._transport = transport
+
+    def execute(self, **kwargs):
+        return self._transport.execute(self.request, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.request, name)
+
+
+def _unwrap(request):
+    return request.request if isinstance(request, _Request) else request
+
+
+def _method_id(request):
+    return getattr(_unwrap(request), "methodId", None) or "drive.request"
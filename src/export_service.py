@@ -0,0 +1,118 @@
+import streamlit as st
+import gzip
+import io
+import os
+import threading
+import logging
+from collections import OrderedDict
+from .inventory_storage import PARQUET_AVAILABLE, PARQUET_MIMETYPE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Export format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+}
+if PARQUET_AVAILABLE:
+    EXPORT_FORMATS["parquet"] = (".parquet", PARQUET_MIMETYPE)
+
+EXPORT_CHUNK_ROWS = 10000  # rows serialized per chunk
+# Total size of cached exports kept in memory
+EXPORT_CACHE_BYTES = int(os.environ.get("INVENTORY_EXPORT_CACHE_MB", 64)) * 1024 * 1024
+
+
+def iter_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield a frame as UTF-8 CSV bytes, a slice of rows at a time, header first"""
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=start == 0).encode("utf-8")
+
+
+def write_export(df, file_format, fd):
+    """Serialize a frame to fd in the given export format"""
+    if file_format == "csv":
+        for chunk in iter_csv_chunks(df):
+            fd.write(chunk)
+    elif file_format == "csv.gz":
+        # mtime=0 keeps the bytes identical for identical content
+        with gzip.GzipFile(fileobj=fd, mode="wb", mtime=0) as compressed:
+            for chunk in iter_csv_chunks(df):
+                compressed.write(chunk)
+    elif file_format == "parquet":
+        df.to_parquet(fd, index=False, compression="zstd")
+    else:
+        raise ValueError(f"Unsupported export format: {file_format}")
+
+
+class ExportService:
+    """Inventory exports generated on request and cached per content.
+
+    An export is identified by (inventory version, view name, filter key,
+    format). The first request serializes the frame in chunks; later
+    requests for the same key get the cached bytes until the inventory
+    changes. Cached exports are evicted least recently used once they
+    exceed max_bytes in total.
+    """
+
+    def __init__(self, max_bytes=EXPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # key -> bytes
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def export(self, df, version, name, key, file_format):
+        """Return the export's bytes, serializing df only if not cached"""
+        cache_key = (version, name, key, file_format)
+        with self._lock:
+            data = self._cache.get(cache_key)
+            if data is not None:
+                self._cache.move_to_end(cache_key)
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        buffer = io.BytesIO()
+        write_export(df, file_format, buffer)
+        data = buffer.getvalue()
+        logger.info(f"Exported {name} ({file_format}): {len(df)} rows, {len(data)} bytes")
+
+        with self._lock:
+            if cache_key not in self._cache and len(data) <= self.max_bytes:
+                self._cache[cache_key] = data
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+    def deferred(self, df, version, name, key, file_format):
+        """A zero-argument callable for st.download_button, run only on click"""
+        return lambda: self.export(df, version, name, key, file_format)
+
+    def stats(self):
+        """Cache counters for display"""
+        with self._lock:
+            return {
+                "Cached Exports": len(self._cache),
+                "Cached Bytes": self._size,
+                "Hits": self.hits,
+                "Misses": self.misses
+            }
+
+
+def export_file_name(stem, file_format):
+    return f"{stem}{EXPORT_FORMATS[file_format][0]}"
+
+
+def export_mime(file_format):
+    return EXPORT_FORMATS[file_format][1]
+
+
+@st.cache_resource
+def get_export_service():
+    """Get the export cache shared by every session"""
+    return ExportService()
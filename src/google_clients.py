@@ -0,0 +1,115 @@
+import streamlit as st
+from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
+from datetime import datetime, timedelta, timezone
+import threading
+import weakref
+from collections import OrderedDict
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How long to trust a verified identity when the token has no expiry
+IDENTITY_TTL = 3600  # seconds
+# Signed-in credentials to keep clients for
+CLIENT_CACHE_SIZE = 64
+
+
+def _utcnow():
+    # google-auth keeps credential expiry as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class GoogleClients:
+    """Google API clients and verified identities, cached per credential.
+
+    Clients are built from the discovery documents bundled with
+    google-api-python-client, so building one never touches the network.
+    Entries are kept in a bounded LRU keyed on id(credentials). Clients hold
+    their credentials strongly, so a weak mapping would never drop them;
+    each entry keeps only a weak reference to check that a reused id still
+    belongs to the same credentials object.
+    """
+
+    def __init__(self, max_entries=CLIENT_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        # id(credentials) -> {'ref': weakref, 'services': {(name, version): client}, 'identity': (user_info, expires_at)}
+        self._entries = OrderedDict()
+        # Per-thread clients for background workers, see thread_service
+        self._local = threading.local()
+
+    def _entry(self, credentials):
+        key = id(credentials)
+        entry = self._entries.get(key)
+        if entry is None or entry['ref']() is not credentials:
+            entry = {'ref': weakref.ref(credentials), 'services': {}, 'identity': None}
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(key)
+        return entry
+
+    def service(self, credentials, name, version):
+        """Return the API client for these credentials, building it once"""
+        with self._lock:
+            services = self._entry(credentials)['services']
+            client = services.get((name, version))
+            if client is None:
+                client = build(name, version, credentials=credentials, static_discovery=True, cache_discovery=False)
+                services[(name, version)] = client
+                logger.info(f"Built {name} {version} client")
+            return client
+
+    def thread_service(self, credentials, name, version):
+        """Return an API client for these credentials owned by the calling thread.
+
+        The shared clients from service() sit on one httplib2 connection,
+        which is not thread-safe, so background threads get their own client
+        over a fresh Http. It lives as long as the thread does.
+        """
+        services = getattr(self._local, 'services', None)
+        if services is None:
+            services = self._local.services = OrderedDict()
+        key = (id(credentials), name, version)
+        cached = services.get(key)
+        if cached is not None and cached[0]() is credentials:
+            services.move_to_end(key)
+            return cached[1]
+
+        http = AuthorizedHttp(credentials, http=httplib2.Http())
+        client = build(name, version, http=http, static_discovery=True, cache_discovery=False)
+        services[key] = (weakref.ref(credentials), client)
+        while len(services) > self.max_entries:
+            services.popitem(last=False)
+        logger.info(f"Built {name} {version} client for thread {threading.current_thread().name}")
+        return client
+
+    def user_info(self, credentials):
+        """Return the signed-in user's profile, fetched once per token lifetime"""
+        with self._lock:
+            cached = self._entry(credentials)['identity']
+            if cached and cached[1] > _utcnow():
+                return cached[0]
+
+        user_info = self.service(credentials, 'oauth2', 'v2').userinfo().get().execute()
+        expires_at = credentials.expiry or _utcnow() + timedelta(seconds=IDENTITY_TTL)
+        with self._lock:
+            self._entry(credentials)['identity'] = (user_info, expires_at)
+        return user_info
+
+    def forget(self, credentials):
+        """Drop cached clients and identity, e.g. on logout"""
+        with self._lock:
+            entry = self._entries.get(id(credentials))
+            if entry is not None and entry['ref']() is credentials:
+                del self._entries[id(credentials)]
+
+
+@st.cache_resource
+def get_google_clients():
+    """Get the Google client cache for this server process"""
+    return GoogleClients()
@@ -2,9 +2,26 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 import os
-import time
+import atexit
 import logging
+from functools import partial
 from src.drive_manager import DriveManager
+from src.inventory_store import get_inventory_store
+from src.write_behind import WriteBehindQueue
+from src.persistence_service import PersistenceService
+from src.backup_manager import get_backup_manager
+from src.calibration_history import get_calibration_history, legacy_records
+from src.sqlite_backend import SQLiteInventory, sqlite_enabled
+from src.search_index import ProbeSearchIndex
+from src.inventory_storage import (
+    INVENTORY_COLUMNS,
+    DATE_COLUMNS,
+    TIMESTAMP_COLUMNS,
+    apply_schema,
+    read_local_file,
+    write_local_file,
+    storage_filename
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -22,42 +39,63 @@ STATUS_COLORS = {
     'Scraped': '#DC143C'       # Crimson - serious but not harsh
 }
 
+# Status markers for tables, matching STATUS_COLORS without a Styler
+STATUS_BADGES = {
+    'Instock': '🟡',
+    'Calibrated': '🟢',
+    'Shipped': '🔵',
+    'Scraped': '🔴'
+}
+DEFAULT_BADGE = '⚪'
+
 def initialize_inventory():
     """Initialize or load existing inventory"""
     try:
-        if 'inventory' not in st.session_state or st.session_state.inventory.empty:
-            if 'drive_manager' in st.session_state:
-                try:
-                    # Try to load from Drive first
-                    file_list = st.session_state.drive_manager.service.files().list(
-                        q=f"name='{INVENTORY_FILENAME}' and '{BACKUP_FOLDER_ID}' in parents",
-                        spaces='drive'
-                    ).execute()
-                    
-                    if file_list.get('files'):
-                        file_id = file_list['files'][0]['id']
-                        df = st.session_state.drive_manager.load_file_from_drive(file_id)
-                        if df is not None:
-                            # Remove Status Color column if it exists
-                            if 'Status Color' in df.columns:
-                                df = df.drop('Status Color', axis=1)
-                            st.session_state.inventory = df
-                            logger.info(f"Loaded inventory from Drive: {len(df)} records")
-                            return
-                except Exception as e:
-                    logger.error(f"Error loading from Drive: {str(e)}")
-            
-            # Create new inventory if loading failed
-            st.session_state.inventory = pd.DataFrame(columns=[
-                "Serial Number", "Type", "Manufacturer", "KETOS P/N",
-                "Mfg P/N", "Next Calibration", "Status", "Entry Date",
-                "Last Modified", "Change Date"
-            ])
-            logger.info("Created new inventory")
+        store = get_inventory_store()
+        df = store.get(st.session_state.get('drive_manager'), BACKUP_FOLDER_ID)
+
+        # Fall back to the local database or file, then to a new inventory
+        db = get_sqlite_inventory()
+        if df is None:
+            df = db.to_dataframe() if db is not None and db.count() else read_local_file()
+            if df is not None:
+                logger.info(f"Loaded local inventory: {len(df)} records")
+            else:
+                df = apply_schema(pd.DataFrame(columns=INVENTORY_COLUMNS))
+                logger.info("Created new inventory")
+            df = store.publish(df)
+
+        # Mirror whatever was loaded from Drive into the database
+        if db is not None and (not db.synced or db.synced_revision != store.revision):
+            db.replace_all(df)
+            db.synced = True
+            db.synced_revision = store.revision
+
+        # Point the session at the shared frame instead of holding a copy
+        if st.session_state.get('inventory') is not df:
+            st.session_state.inventory = df
+        st.session_state['inventory_version'] = store.version
+
+        migrate_calibration_data(store)
     except Exception as e:
         logger.error(f"Error initializing inventory: {str(e)}")
         st.error("Error initializing inventory. Please try refreshing the page.")
 
+def migrate_calibration_data(store):
+    """Move legacy JSON 'Calibration Data' blobs into the calibration history"""
+    history = get_calibration_history()
+    drive_manager = st.session_state.get('drive_manager')
+    if drive_manager is not None and not history.synced:
+        history.sync(drive_manager, BACKUP_FOLDER_ID)
+
+    # Scanned once per inventory version
+    records = store.derived('legacy_calibration', legacy_records)
+    if records is None or records.empty:
+        return
+    migrated = history.migrate_legacy(records)
+    apply_probe_updates(migrated, {'Calibration Data': None})
+    queue_inventory_save()
+
 def get_filtered_inventory(status_filter="All"):
     """Get filtered inventory based on status"""
     try:
@@ -68,150 +106,301 @@ def get_filtered_inventory(status_filter="All"):
         logger.error(f"Error filtering inventory: {str(e)}")
         return pd.DataFrame()
 
-def style_inventory_dataframe(df):
-    """Apply color styling to inventory dataframe based on status"""
+def write_local_inventory(inventory_df, version_control=True):
+    """Write the inventory to local disk, plus a deduplicated backup snapshot.
+
+    Returns the new backup entry, or None if no backup was taken because
+    version_control is off or nothing changed since the last backup.
+    """
+    main_filename = write_local_file(inventory_df)
+    logger.info(f"Updated main inventory file: {main_filename}")
+
+    if not version_control:
+        return None
+    backup = get_backup_manager().snapshot(inventory_df)
+    if backup is not None:
+        get_backup_manager().prune()
+    return backup
+
+def date_column_config():
+    """Streamlit column config that shows schema date columns without seconds"""
+    return {
+        column: st.column_config.DatetimeColumn(column, format="YYYY-MM-DD HH:mm")
+        if column in TIMESTAMP_COLUMNS
+        else st.column_config.DateColumn(column, format="YYYY-MM-DD")
+        for column in DATE_COLUMNS
+    }
+
+def sync_backups(drive_manager):
+    """Copy backups that are not on Drive yet and thin out old ones there too"""
     try:
-        def color_status(val):
-            return f'background-color: {STATUS_COLORS.get(val, "white")}'
-        
-        # Only color the Status column
-        return df.style.applymap(color_status, subset=['Status'])
+        backup_manager = get_backup_manager()
+        uploaded = backup_manager.upload_pending(drive_manager, BACKUP_FOLDER_ID)
+        backup_manager.prune(drive_manager)
+        if uploaded:
+            logger.info(f"Uploaded {uploaded} backups to Drive")
     except Exception as e:
-        logger.error(f"Error styling dataframe: {str(e)}")
-        return df
+        logger.error(f"Error syncing backups to Drive: {str(e)}")
 
-def save_inventory(inventory_df, version_control=True):
-    """Save inventory with versioning"""
-    try:
-        # Remove Status Color column if it exists
-        if 'Status Color' in inventory_df.columns:
-            inventory_df = inventory_df.drop('Status Color', axis=1)
-        
-        # Save or update main file
-        inventory_df.to_csv(INVENTORY_FILENAME, index=False)
-        logger.info(f"Updated main inventory file: {INVENTORY_FILENAME}")
-        
-        # Version control backup every 5 days
-        if version_control and datetime.now().day % 5 == 0:
-            backup_filename = f"inventory_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-            inventory_df.to_csv(backup_filename, index=False)
-            logger.info(f"Created version control backup: {backup_filename}")
-            
-            # Save backup to Drive if available
-            if 'drive_manager' in st.session_state:
-                st.session_state.drive_manager.save_to_drive(
-                    backup_filename,
-                    BACKUP_FOLDER_ID
-                )
-        
-        # Save to Drive
-        if 'drive_manager' in st.session_state:
-            st.session_state.drive_manager.save_to_drive(
-                INVENTORY_FILENAME,
-                BACKUP_FOLDER_ID
-            )
-        
+def persist_changes(inventory_df, serial_numbers, drive_manager=None, folder_id=None, db=None):
+    """Write the inventory locally and send the changed rows to Google Drive"""
+    # With SQLite enabled every edit is already committed locally
+    if db is None:
+        try:
+            write_local_inventory(inventory_df, version_control=False)
+        except Exception as e:
+            logger.error(f"Error saving inventory: {str(e)}")
+            return False
+
+    if drive_manager is None or not folder_id:
         return True
-    except Exception as e:
-        logger.error(f"Error saving inventory: {str(e)}")
+    # Runs on a background thread, which must not share the session's connection
+    drive_manager = drive_manager.for_current_thread()
+    get_calibration_history().sync(drive_manager, folder_id)
+    if db is not None:
+        return db.replicate_to_drive(drive_manager, folder_id, serial_numbers)
+    return drive_manager.save_to_drive(inventory_df, folder_id, serial_numbers=serial_numbers)
+
+@st.cache_resource
+def get_sqlite_inventory():
+    """Get the embedded SQLite inventory, or None when that backend is disabled"""
+    return SQLiteInventory() if sqlite_enabled() else None
+
+@st.cache_resource
+def get_write_queue():
+    """Get the single write-behind queue for this server process"""
+    return WriteBehindQueue(
+        get_inventory_store(),
+        partial(persist_changes, db=get_sqlite_inventory())
+    )
+
+def checkpoint_inventory(inventory_df):
+    """Write a local checkpoint of the inventory and return its size in bytes.
+
+    Backups are then copied to Drive through the write queue's Drive
+    manager, so they survive the local disk being wiped on restart.
+    """
+    write_local_inventory(inventory_df)
+    size = os.path.getsize(storage_filename())
+    drive_manager, _ = get_write_queue().drive_target()
+    if drive_manager is not None:
+        sync_backups(drive_manager.for_current_thread())
+    return size
+
+@st.cache_resource
+def get_persistence_service():
+    """Get the single background persistence service for this server process"""
+    service = PersistenceService(
+        get_inventory_store(),
+        checkpoint_inventory,
+        flush=get_write_queue().flush
+    )
+    # Final checkpoint when the server shuts down
+    atexit.register(service.stop)
+    return service
+
+def queue_inventory_save():
+    """Hand the latest edits to the write-behind queue without waiting on Drive"""
+    get_write_queue().submit(
+        st.session_state.get('drive_manager'),
+        st.session_state.get('drive_folder_id')
+    )
+    return True
+
+def sync_with_drive(drive_manager, folder_id):
+    """Push pending edits and fold Drive's change log into its main file.
+
+    Only rows edited in this process are sent; all others come from Drive's
+    own copy, so a stale row held here never overwrites a newer edit made
+    elsewhere.
+    """
+    write_queue = get_write_queue()
+    write_queue.submit(drive_manager, folder_id)
+    if not write_queue.flush():
         return False
-def update_probe_status(serial_number, new_status):
-    """Update probe status and metadata"""
-    try:
-        if serial_number in st.session_state.inventory['Serial Number'].values:
-            mask = st.session_state.inventory['Serial Number'] == serial_number
-            st.session_state.inventory.loc[mask, 'Status'] = new_status
-            st.session_state.inventory.loc[mask, 'Change Date'] = datetime.now().strftime('%Y-%m-%d')
-            st.session_state.inventory.loc[mask, 'Last Modified'] = datetime.now().strftime('%Y-%m-%d')
-            
-            # Save changes immediately to CSV and Drive
-            save_success = save_inventory(st.session_state.inventory)
-            
-            # Save to Google Drive if configured
-            if save_success and 'drive_manager' in st.session_state and 'drive_folder_id' in st.session_state:
-                drive_success = st.session_state.drive_manager.save_to_drive(
-                    st.session_state.inventory,
-                    st.session_state.get('drive_folder_id')
-                )
-                if drive_success:
-                    st.session_state['last_save_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                return drive_success
-            return save_success
+    if not drive_manager.compact_changes(folder_id):
         return False
+    get_inventory_store().invalidate()
+    return True
+
+def find_probe(serial_number):
+    """Find a probe in the inventory by serial number."""
+    db = get_sqlite_inventory()
+    if db is not None:
+        return db.get(serial_number)
+
+    return get_inventory_store().get_probe(serial_number)
+
+def get_probe_search_index():
+    """Get the probe search index for the current inventory version.
+
+    The index is built once per inventory version and shared by every session.
+    """
+    index = get_inventory_store().derived('probe_search', ProbeSearchIndex)
+    if index is None and 'inventory' in st.session_state:
+        index = ProbeSearchIndex(st.session_state.inventory)
+    return index
+
+def apply_probe_updates(serial_numbers, values):
+    """Set column values on probes in the database (if enabled) and the shared inventory"""
+    db = get_sqlite_inventory()
+    if db is not None and not db.update(serial_numbers, values):
+        return 0
+    updated = get_inventory_store().update_rows(serial_numbers, values)
+    st.session_state.inventory = get_inventory_store().current()
+    return updated
+
+def transition_errors(current_status, new_status):
+    """Why each probe may not move to new_status (None where it may).
+
+    current_status is a Series of statuses; the rules are applied to all of
+    them at once.
+    """
+    reasons = pd.Series(None, index=current_status.index, dtype=object)
+    reasons[current_status == new_status] = f"Already {new_status}"
+    if new_status != 'Scraped':
+        reasons[current_status == 'Scraped'] = "Scraped probes cannot be restored to other statuses."
+    if new_status == 'Instock':
+        reasons[current_status == 'Calibrated'] = "Calibrated probes cannot be moved back to Instock status."
+    return reasons
+
+def select_serials(inventory_df, types=None, statuses=None, contains=""):
+    """Serial numbers of probes matching a bulk-update filter"""
+    mask = pd.Series(True, index=inventory_df.index)
+    if types:
+        mask &= inventory_df['Type'].isin(types)
+    if statuses:
+        mask &= inventory_df['Status'].isin(statuses)
+    if contains:
+        mask &= inventory_df['Serial Number'].str.contains(contains, case=False, regex=False, na=False)
+    return inventory_df.loc[mask, 'Serial Number'].tolist()
+
+def bulk_update_status(serial_numbers, new_status):
+    """Move many probes to new_status with one update and one queued save.
+
+    Returns one row per requested serial number with its previous status,
+    whether it was updated, and the reason when it was not.
+    """
+    requested = pd.Index(pd.unique(pd.Series(list(serial_numbers), dtype=object)), name='Serial Number')
+    results = pd.DataFrame(index=requested)
+    try:
+        inventory = get_inventory_store().current()
+        if inventory is None:
+            inventory = st.session_state.inventory
+        statuses = inventory.drop_duplicates('Serial Number', keep='last').set_index('Serial Number')['Status']
+        results['Previous Status'] = statuses.reindex(requested)
+        reasons = transition_errors(results['Previous Status'], new_status)
+        reasons[~requested.isin(statuses.index)] = "Not found in inventory"
+        results['Reason'] = reasons
+
+        allowed = requested[reasons.isna().to_numpy()].tolist()
+        updated = 0
+        if allowed:
+            now = datetime.now()
+            updated = apply_probe_updates(allowed, {
+                'Status': new_status,
+                'Change Date': now.strftime('%Y-%m-%d'),
+                'Last Modified': now
+            })
+            if updated:
+                queue_inventory_save()
+        if allowed and updated != len(allowed):
+            results.loc[allowed, 'Reason'] = "Update failed"
+        results['Updated'] = results['Reason'].isna()
+        logger.info(f"Bulk status change to {new_status}: {int(results['Updated'].sum())} of {len(results)} probes")
     except Exception as e:
-        logger.error(f"Error updating status: {str(e)}")
-        return False
-        
+        logger.error(f"Error updating statuses: {str(e)}")
+        results['Updated'] = False
+        results['Reason'] = f"Update failed: {str(e)}"
+    return results.reset_index()[['Serial Number', 'Previous Status', 'Updated', 'Reason']]
+
+def update_probe_status(serial_number, new_status):
+    """Update probe status and metadata"""
+    return bool(bulk_update_status([serial_number], new_status)['Updated'].iloc[0])
+
+
+def format_serial_number(probe_type, manufacturing_date, sequence):
+    """Build a serial number from its type, expiry month and sequence"""
+    expire_date = manufacturing_date + timedelta(days=365 * 2)  # 2-year default
+    expire_yymm = expire_date.strftime("%y%m")
+    return f"{probe_type.split()[0]}_{expire_yymm}_{sequence:05d}"
+
+def format_serial_numbers(probe_type, manufacturing_dates, sequences):
+    """format_serial_number for many probes of one type at once"""
+    expire_yymm = (pd.to_datetime(manufacturing_dates) + pd.Timedelta(days=365 * 2)).dt.strftime("%y%m")
+    sequence_text = pd.Series(list(sequences), index=expire_yymm.index).map("{:05d}".format)
+    return f"{probe_type.split()[0]}_" + expire_yymm + "_" + sequence_text
 
 def get_next_serial_number(probe_type, manufacturing_date):
-    """Generate sequential serial number"""
+    """Preview the next sequential serial number without reserving it"""
     try:
-        existing_serials = st.session_state.inventory[
-            st.session_state.inventory['Type'] == probe_type
-        ]['Serial Number'].tolist()
-        
-        if existing_serials:
-            sequence_numbers = [
-                int(serial.split('_')[-1])
-                for serial in existing_serials
-            ]
-            next_sequence = max(sequence_numbers) + 1
-        else:
-            next_sequence = 1
-        
-        expire_date = manufacturing_date + timedelta(days=365 * 2)  # 2-year default
-        expire_yymm = expire_date.strftime("%y%m")
-        return f"{probe_type.split()[0]}_{expire_yymm}_{next_sequence:05d}"
+        next_sequence = get_inventory_store().next_sequence(probe_type)
+        return format_serial_number(probe_type, manufacturing_date, next_sequence)
         
     except Exception as e:
         logger.error(f"Error generating serial number: {str(e)}")
         return None
 
+def allocate_serial_numbers(probe_type, manufacturing_date, count=1):
+    """Reserve sequential serial numbers so no other session can take them"""
+    try:
+        first_sequence = get_inventory_store().allocate_sequences(probe_type, count)
+        return [
+            format_serial_number(probe_type, manufacturing_date, first_sequence + offset)
+            for offset in range(count)
+        ]
+    except Exception as e:
+        logger.error(f"Error allocating serial numbers: {str(e)}")
+        return None
+
 def add_new_probe(probe_data):
     """Add a new probe to the inventory"""
+    # Remove Status Color if it exists
+    probe_data = {key: value for key, value in probe_data.items() if key != 'Status Color'}
+    return add_new_probes(pd.DataFrame([probe_data]))
+
+def add_new_probes(probes_df):
+    """Add new probes to the inventory with one append and one queued save"""
     try:
-        # Remove Status Color if it exists
-        if 'Status Color' in probe_data:
-            del probe_data['Status Color']
-        
         # Add metadata
-        probe_data['Entry Date'] = datetime.now().strftime('%Y-%m-%d')
-        probe_data['Last Modified'] = datetime.now().strftime('%Y-%m-%d')
-        probe_data['Change Date'] = datetime.now().strftime('%Y-%m-%d')
-        probe_data['Status'] = 'Instock'
-        
-        # Create new row
-        new_row_df = pd.DataFrame([probe_data])
-        
-        # Append to inventory
-        st.session_state.inventory = pd.concat(
-            [st.session_state.inventory, new_row_df],
-            ignore_index=True
-        )
-        
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        new_rows_df = apply_schema(probes_df.assign(**{
+            'Entry Date': today,
+            'Last Modified': now,
+            'Change Date': today,
+            'Status': 'Instock'
+        }))
+
+        # Append to the database (if enabled) and the shared inventory
+        db = get_sqlite_inventory()
+        if db is not None:
+            db.upsert(new_rows_df)
+        st.session_state.inventory = get_inventory_store().append(new_rows_df)
+
         # Save changes
-        return save_inventory(st.session_state.inventory)
+        return queue_inventory_save()
     except Exception as e:
-        logger.error(f"Error adding new probe: {str(e)}")
+        logger.error(f"Error adding new probes: {str(e)}")
         return False
 
-# Start periodic save thread
-def start_periodic_save():
-    def periodic_save_task():
-        while True:
-            time.sleep(600)  # 10 minutes
-            try:
-                if 'inventory' in st.session_state:
-                    logger.info("Performing periodic save...")
-                    save_inventory(st.session_state.inventory)
-                    logger.info("Periodic save completed")
-            except Exception as e:
-                logger.error(f"Error in periodic save: {str(e)}")
-    
-    import threading
-    save_thread = threading.Thread(target=periodic_save_task, daemon=True)
-    save_thread.start()
-    logger.info("Started periodic save thread")
-
-# Start the periodic save thread when the module is imported
-start_periodic_save()
+def register_probes(manifest_df):
+    """Register validated manifest rows, allocating serial numbers per type in one step.
+
+    Returns the new inventory rows, or None if they could not be added.
+    """
+    store = get_inventory_store()
+    serial_numbers = pd.Series(index=manifest_df.index, dtype=object)
+    for probe_type, rows in manifest_df.groupby('Type', sort=False):
+        first_sequence = store.allocate_sequences(probe_type, len(rows))
+        serial_numbers[rows.index] = format_serial_numbers(
+            probe_type, rows['Manufacturing Date'], range(first_sequence, first_sequence + len(rows))
+        )
+    probes_df = manifest_df.drop(columns=['Manufacturing Date']).assign(**{
+        'Serial Number': serial_numbers,
+        'Calibration Data': None
+    })
+    if not add_new_probes(probes_df):
+        return None
+    logger.info(f"Registered {len(probes_df)} probes from a manifest")
+    return probes_df[['Serial Number'] + [column for column in probes_df.columns if column != 'Serial Number']]
@@ -0,0 +1,89 @@
+import pandas as pd
+import numpy as np
+import logging
+from .inventory_storage import INVENTORY_COLUMNS, apply_schema
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns that decide which copy of a probe is newer, most significant first
+VERSION_COLUMNS = ["Last Modified", "Change Date"]
+
+
+def merge_inventories(base_df, incoming_df):
+    """Keyed upsert of incoming_df into base_df by serial number.
+
+    Each probe keeps its newest row, compared on Last Modified (a full
+    timestamp), then Change Date. A missing date counts as older than any
+    date, so an incoming row without Last Modified does not replace a base
+    row that has one. On an exact tie, including both dates missing, the
+    incoming row wins, and later incoming rows win over earlier ones, which
+    makes a concatenation of change logs safe to pass as incoming_df. Row
+    order follows base_df, with new probes appended.
+
+    Returns (merged, stats) where stats counts the merged rows that were
+    inserted (new serials), updated (base row replaced by a different row)
+    and unchanged.
+    """
+    base_empty = base_df is None or base_df.empty
+    if base_empty and (incoming_df is None or incoming_df.empty):
+        merged = base_df if incoming_df is None else incoming_df
+        return merged.reset_index(drop=True), {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    frames = [df for df in (base_df, incoming_df) if df is not None and not df.empty]
+    combined = pd.concat(frames, ignore_index=True)
+    from_incoming = np.arange(len(combined)) >= (0 if base_empty else len(base_df))
+
+    sort_keys = pd.DataFrame({
+        column: pd.to_datetime(combined[column], errors='coerce')
+        for column in VERSION_COLUMNS
+        if column in combined.columns
+    })
+    # Stable sort keeps later rows after earlier rows with equal dates
+    if sort_keys.columns.empty:
+        newest_last = combined.index
+    else:
+        newest_last = sort_keys.sort_values(list(sort_keys.columns), kind='stable', na_position='first').index
+    survivors = combined.loc[newest_last, 'Serial Number'].drop_duplicates(keep='last').index
+    first_seen = combined['Serial Number'].drop_duplicates()
+    order = pd.Series(survivors, index=combined.loc[survivors, 'Serial Number']).reindex(first_seen).to_numpy()
+    merged = combined.loc[order].reset_index(drop=True)
+
+    # Sources with different dtypes (e.g. dates read as text) are normalised before comparing
+    same_dtypes = len(frames) == 1 or frames[0].dtypes.equals(frames[1].dtypes)
+    stats = _merge_stats(combined, order, from_incoming, base_empty, same_dtypes)
+    logger.info(
+        f"Merged inventories: {stats['inserted']} inserted, "
+        f"{stats['updated']} updated, {stats['unchanged']} unchanged"
+    )
+    return merged, stats
+
+
+def _merge_stats(combined, survivors, from_incoming, base_empty, same_dtypes):
+    """Count inserted, updated and unchanged rows of a merge"""
+    if base_empty:
+        return {"inserted": len(survivors), "updated": 0, "unchanged": 0}
+
+    serials = combined['Serial Number']
+    base_rows = serials[~from_incoming].drop_duplicates(keep='last')
+    in_base = serials.loc[survivors].isin(base_rows).to_numpy()
+    replaced = survivors[in_base & from_incoming[survivors]]
+
+    updated = 0
+    if len(replaced):
+        # Compare the winning incoming rows with the base rows they replace
+        previous = pd.Series(base_rows.index, index=base_rows.to_numpy()).loc[serials.loc[replaced]].to_numpy()
+        hashes = _row_hashes(combined.loc[np.concatenate([replaced, previous])], same_dtypes)
+        updated = int((hashes[:len(replaced)] != hashes[len(replaced):]).sum())
+
+    inserted = int((~in_base).sum())
+    return {"inserted": inserted, "updated": updated, "unchanged": len(survivors) - inserted - updated}
+
+
+def _row_hashes(rows_df, same_dtypes):
+    """One hash per row over the schema columns"""
+    if same_dtypes:
+        columns = [column for column in INVENTORY_COLUMNS if column in rows_df.columns]
+        return pd.util.hash_pandas_object(rows_df[columns], index=False).to_numpy()
+    return pd.util.hash_pandas_object(apply_schema(rows_df)[INVENTORY_COLUMNS], index=False).to_numpy()
@@ -1,49 +1,124 @@
 import streamlit as st
 import pandas as pd
 import time
-import json
+import re
 from datetime import datetime
 from .inventory_manager import (
     initialize_inventory,
-    get_filtered_inventory,
-    style_inventory_dataframe,
     update_probe_status,
-    save_inventory,
-    STATUS_COLORS
+    bulk_update_status,
+    select_serials,
+    transition_errors,
+    get_write_queue,
+    date_column_config,
+    find_probe,
+    get_probe_search_index,
+    STATUS_COLORS,
+    STATUS_BADGES
 )
+from .inventory_storage import format_date
+from .calibration_history import get_calibration_history
+from .inventory_store import get_inventory_store
+from .export_service import EXPORT_FORMATS, get_export_service, export_file_name, export_mime
+from .review_table import PAGE_SIZES, DEFAULT_PAGE_SIZE, get_review_view, page_count, page_rows
+
+# Probes offered in the status-update picker for a search
+SEARCH_RESULT_LIMIT = 20
 
 def display_calibration_details(probe_data):
-    """Display detailed calibration information in the inventory review."""
-    if 'Calibration Data' in probe_data and probe_data['Calibration Data']:
-        try:
-            calibration_data = json.loads(probe_data['Calibration Data'])
-            
-            st.markdown("#### Calibration Details")
-            
-            if 'calibration_date' in calibration_data:
-                st.write(f"**Calibration Date:** {calibration_data['calibration_date']}")
-            
-            # Display pH calibration data if present
-            if probe_data['Type'] == "pH Probe":
-                for buffer_label in ["pH 4", "pH 7", "pH 10"]:
-                    if any(f"{buffer_label}" in key for key in calibration_data.keys()):
-                        st.markdown(f"##### {buffer_label} Buffer Data")
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.write(f"Control Number: {calibration_data.get(f'{buffer_label}_control', 'N/A')}")
-                            st.write(f"Expiration Date: {calibration_data.get(f'{buffer_label}_exp', 'N/A')}")
-                            st.write(f"Date Opened: {calibration_data.get(f'{buffer_label}_opened', 'N/A')}")
-                        
-                        with col2:
-                            st.write("pH Measurements:")
-                            st.write(f"- Initial: {calibration_data.get(f'{buffer_label}_initial', 'N/A')} pH")
-                            st.write(f"- Calibrated: {calibration_data.get(f'{buffer_label}_calibrated', 'N/A')} pH")
-                            st.write("mV Measurements:")
-                            st.write(f"- Initial: {calibration_data.get(f'{buffer_label}_initial_mv', 'N/A')} mV")
-                            st.write(f"- Calibrated: {calibration_data.get(f'{buffer_label}_calibrated_mv', 'N/A')} mV")
-        except Exception as e:
-            st.error(f"Error displaying calibration data: {str(e)}")
+    """Display a probe's latest calibration and its full history."""
+    try:
+        history = get_calibration_history().history(probe_data['Serial Number'])
+        if history.empty:
+            st.info("No calibration recorded for this probe.")
+            return
+
+        latest_date = history['Calibration Date'].iloc[0]
+        latest = history[history['Calibration Date'] == latest_date]
+        st.markdown("#### Calibration Details")
+        st.write(f"**Calibration Date:** {format_date(latest_date)}")
+
+        for _, event in latest.iterrows():
+            st.markdown(f"##### {event['Standard']}")
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.write(f"Control Number: {event['Control Number'] or 'N/A'}")
+                st.write(f"Expiration Date: {format_date(event['Expiration Date'])}")
+                st.write(f"Date Opened: {format_date(event['Date Opened'])}")
+
+            with col2:
+                st.write(f"- Initial: {_reading(event['Initial'])} {event['Unit']}")
+                st.write(f"- Calibrated: {_reading(event['Calibrated'])} {event['Unit']}")
+                if pd.notna(event['Initial mV']) or pd.notna(event['Calibrated mV']):
+                    st.write(f"- Initial: {_reading(event['Initial mV'])} mV")
+                    st.write(f"- Calibrated: {_reading(event['Calibrated mV'])} mV")
+
+        if history['Calibration Date'].nunique() > 1:
+            st.markdown("#### Calibration History")
+            st.dataframe(
+                history.drop(columns=['Serial Number', 'Probe Type']),
+                hide_index=True,
+                column_config={
+                    column: st.column_config.DateColumn(column, format="YYYY-MM-DD")
+                    for column in ['Calibration Date', 'Expiration Date', 'Date Opened']
+                }
+            )
+    except Exception as e:
+        st.error(f"Error displaying calibration data: {str(e)}")
+
+
+def _reading(value):
+    return 'N/A' if pd.isna(value) else value
+
+
+def parse_serial_numbers(text):
+    """Serial numbers pasted one per line or separated by commas, semicolons or spaces"""
+    return [serial for serial in re.split(r"[\s,;]+", text) if serial]
+
+
+def render_bulk_status_update():
+    """Change the status of many probes at once, with a result per probe."""
+    st.markdown("### Bulk Status Update")
+    inventory = st.session_state.inventory
+
+    with st.expander("Update many probes", expanded='bulk_status_results' in st.session_state):
+        mode = st.radio("Select probes by", ["Serial numbers", "Filter"], horizontal=True, key="bulk_mode")
+        if mode == "Serial numbers":
+            serial_numbers = parse_serial_numbers(st.text_area(
+                "Serial numbers (one per line, or separated by commas)",
+                key="bulk_serials"
+            ))
+        else:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                types = st.multiselect("Probe Type", sorted(inventory['Type'].dropna().unique()), key="bulk_types")
+            with col2:
+                statuses = st.multiselect("Current Status", list(STATUS_COLORS), key="bulk_statuses")
+            with col3:
+                contains = st.text_input("Serial number contains", key="bulk_contains").strip()
+            serial_numbers = select_serials(inventory, types, statuses, contains) if (types or statuses or contains) else []
+
+        new_status = st.selectbox("New Status", list(STATUS_COLORS), key="bulk_new_status")
+        st.caption(f"{len(serial_numbers):,} probes selected")
+
+        if st.button(f"Apply to {len(serial_numbers):,} probes", disabled=not serial_numbers, key="bulk_apply"):
+            with st.spinner("Updating statuses..."):
+                st.session_state['bulk_status_results'] = bulk_update_status(serial_numbers, new_status)
+            st.rerun()
+
+        results = st.session_state.get('bulk_status_results')
+        if results is not None:
+            updated = int(results['Updated'].sum())
+            if updated:
+                st.success(f"✅ Updated {updated} of {len(results)} probes; changes queued as one save")
+            skipped = results[~results['Updated']]
+            if not skipped.empty:
+                st.warning(f"⚠️ {len(skipped)} probes were not updated")
+            st.dataframe(results, hide_index=True, use_container_width=True)
+            if st.button("Clear results", key="bulk_clear"):
+                del st.session_state['bulk_status_results']
+                st.rerun()
 
 
 def inventory_review_page():
@@ -59,11 +134,11 @@ def inventory_review_page():
         ["All", "Instock", "Calibrated", "Shipped", "Scraped"]
     )
     
-    # Get filtered inventory
-    filtered_inventory = get_filtered_inventory(status_filter)
-    
-    # Display inventory with styling
-    if not filtered_inventory.empty:
+    # Display rows are built once per (inventory version, filter) and shared
+    view = get_review_view(st.session_state.inventory, status_filter)
+
+    # Display inventory one page at a time
+    if view['total']:
         # Add status color preview
         st.markdown("### Status Color Legend")
         legend_cols = st.columns(len(STATUS_COLORS))
@@ -71,27 +146,41 @@ def inventory_review_page():
             legend_cols[i].markdown(
                 f'<div style="background-color: {color}; padding: 10px; '
                 f'border-radius: 5px; text-align: center; margin: 5px;">'
-                f'{status}</div>',
+                f'{STATUS_BADGES[status]} {status}</div>',
                 unsafe_allow_html=True
             )
 
         st.markdown("### Inventory Data")
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE))
+        pages = page_count(view['total'], page_size)
+        with col2:
+            page = st.number_input("Page", min_value=1, max_value=pages, value=1, step=1)
+        with col3:
+            first = (page - 1) * page_size + 1
+            st.caption(f"Rows {first:,}–{min(page * page_size, view['total']):,} of {view['total']:,} ({pages:,} pages)")
+
         st.dataframe(
-            style_inventory_dataframe(filtered_inventory),
+            page_rows(view, page, page_size),
             height=400,
-            use_container_width=True
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                **date_column_config(),
+                'Status': st.column_config.TextColumn('Status')
+            }
         )
 
         # Add summary statistics
         st.markdown("### Inventory Summary")
-        status_counts = filtered_inventory['Status'].value_counts()
         summary_cols = st.columns(len(STATUS_COLORS))
         for i, status in enumerate(STATUS_COLORS.keys()):
-            count = status_counts.get(status, 0)
+            count = int(view['counts'].get(status, 0))
             summary_cols[i].metric(
                 label=status,
                 value=count,
-                delta=f"{count/len(filtered_inventory)*100:.1f}%" if len(filtered_inventory) > 0 else "0%"
+                delta=f"{count/view['total']*100:.1f}%"
             )
     else:
         st.info("No records found for the selected filter.")
@@ -103,38 +192,36 @@ def inventory_review_page():
         col1, col2 = st.columns(2)
         
         with col1:
-            # Add search functionality for probe selection
+            # Top matches from the shared trigram index, not a scan of every row
             search_term = st.text_input(
-                "Search Probe (Serial Number or Type)",
+                "Search Probe (Serial Number, Type or Manufacturer)",
                 key="probe_search_update"
-            ).strip().lower()
-
-            filtered_probes = st.session_state.inventory[
-                (st.session_state.inventory['Serial Number'].str.lower().str.contains(search_term, na=False)) |
-                (st.session_state.inventory['Type'].str.lower().str.contains(search_term, na=False))
-            ]
+            ).strip()
 
-            selected_probe = st.selectbox(
-                "Select Probe",
-                filtered_probes['Serial Number'].tolist() if not filtered_probes.empty else ["No matches found"]
-            )
+            selected_probe = None
+            search_index = get_probe_search_index()
+            if search_term and search_index is not None:
+                matches = search_index.search(search_term, limit=SEARCH_RESULT_LIMIT)
+                selected_probe = st.selectbox(
+                    "Select Probe",
+                    [match['serial'] for match in matches] if matches else ["No matches found"]
+                )
+            else:
+                st.caption(f"Type to search; the best {SEARCH_RESULT_LIMIT} matches are listed.")
             
             if selected_probe and selected_probe != "No matches found":
-                probe_info = st.session_state.inventory[
-                    st.session_state.inventory['Serial Number'] == selected_probe
-                ].iloc[0]
+                probe_info = find_probe(selected_probe)
                 
                 # Show probe details
                 st.markdown("#### Probe Details")
                 st.write(f"Type: {probe_info['Type']}")
                 st.write(f"Current Status: {probe_info['Status']}")
                 if 'Next Calibration' in probe_info:
-                    st.write(f"Next Calibration: {probe_info['Next Calibration']}")
+                    st.write(f"Next Calibration: {format_date(probe_info['Next Calibration'])}")
                     
                 # Add calibration details display
-                if probe_info['Type'] == "pH Probe":
-                    with st.expander("View Calibration Details"):
-                        display_calibration_details(probe_info)
+                with st.expander("View Calibration Details"):
+                    display_calibration_details(probe_info)
         
         with col2:
             if selected_probe and selected_probe != "No matches found":
@@ -151,15 +238,12 @@ def inventory_review_page():
                 status_warning = None
                 status_change_allowed = True
                 
-                if current_status == "Scraped" and new_status != "Scraped":
-                    status_warning = "⚠️ Scraped probes cannot be restored to other statuses."
-                    status_change_allowed = False
-                elif current_status == "Calibrated" and new_status == "Instock":
-                    status_warning = "⚠️ Calibrated probes cannot be moved back to Instock status."
-                    status_change_allowed = False
+                if new_status != current_status:
+                    status_warning = transition_errors(pd.Series([current_status]), new_status).iloc[0]
+                    status_change_allowed = status_warning is None
                 
                 if status_warning:
-                    st.warning(status_warning)
+                    st.warning(f"⚠️ {status_warning}")
                 
                 # Preview color for selected status
                 st.markdown(
@@ -176,9 +260,9 @@ def inventory_review_page():
                             if update_probe_status(selected_probe, new_status):
                                 st.success(f"✅ Updated status of {selected_probe} to {new_status}")
                                 if 'drive_manager' in st.session_state:
-                                    st.success("✅ Changes saved to both local inventory and Google Drive")
+                                    st.success("✅ Changes queued for local inventory and Google Drive")
                                 else:
-                                    st.success("✅ Changes saved to local inventory")
+                                    st.success("✅ Changes queued for local inventory")
                                 time.sleep(1)  # Give time for the user to see the success message
                                 st.rerun()
                             else:
@@ -187,48 +271,55 @@ def inventory_review_page():
                         st.info("ℹ️ No status change selected")
                 
                 # Add last save information
-                if 'last_save_time' in st.session_state:
+                write_queue = get_write_queue()
+                if write_queue.last_flush_time:
                     st.markdown(
                         f"""
                         <div style='padding: 10px; background-color: #f0f2f6; border-radius: 5px; margin-top: 10px;'>
-                            📝 Last saved: {st.session_state['last_save_time']}
+                            📝 Last saved: {write_queue.last_flush_time}
+                            ({write_queue.pending_count()} pending)
                         </div>
                         """,
                         unsafe_allow_html=True
                     )
 
-    # Download section
+    render_bulk_status_update()
+
+    # Download section: exports are generated on click and cached per inventory version
     st.markdown("### Download Inventory")
+    exports = get_export_service()
+    version = get_inventory_store().version
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    file_format = st.selectbox("Export Format", list(EXPORT_FORMATS))
     col1, col2 = st.columns(2)
     
     with col1:
         # Download filtered inventory
-        csv = filtered_inventory.to_csv(index=False).encode("utf-8")
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         st.download_button(
             label="Download Filtered Inventory",
-            data=csv,
-            file_name=f"inventory_filtered_{timestamp}.csv",
-            mime="text/csv",
+            data=exports.deferred(view['inventory'], version, 'review', status_filter, file_format),
+            file_name=export_file_name(f"inventory_filtered_{timestamp}", file_format),
+            mime=export_mime(file_format),
         )
     
     with col2:
         # Download full inventory
-        full_csv = st.session_state.inventory.to_csv(index=False).encode("utf-8")
         st.download_button(
             label="Download Full Inventory",
-            data=full_csv,
-            file_name=f"inventory_full_{timestamp}.csv",
-            mime="text/csv",
+            data=exports.deferred(st.session_state.inventory, version, 'full', None, file_format),
+            file_name=export_file_name(f"inventory_full_{timestamp}", file_format),
+            mime=export_mime(file_format),
         )
 
     # Debug information
     with st.expander("Debug Info", expanded=False):
         st.write({
             "Total Records": len(st.session_state.inventory),
-            "Filtered Records": len(filtered_inventory),
-            "Last Save": st.session_state.get('last_save_time', 'Never'),
+            "Filtered Records": view['total'],
+            "Last Save": get_write_queue().last_flush_time or 'Never',
+            "Pending Writes": get_write_queue().pending_count(),
             "Drive Status": 'drive_manager' in st.session_state,
-            "Status Distribution": dict(st.session_state.inventory['Status'].value_counts())
+            "Status Distribution": dict(st.session_state.inventory['Status'].value_counts()),
+            "Exports": exports.stats()
         })
 
@@ -0,0 +1,140 @@
+import pandas as pd
+import io
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Parquet needs pyarrow; without it everything falls back to CSV
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+INVENTORY_PARQUET_FILENAME = "wbpms_inventory_2024.parquet"
+INVENTORY_CSV_FILENAME = "wbpms_inventory_2024.csv"
+PARQUET_MIMETYPE = "application/vnd.apache.parquet"
+
+# Fixed inventory schema, in column order
+TEXT_COLUMNS = [
+    "Serial Number", "Type", "Manufacturer", "KETOS P/N",
+    "Mfg P/N", "Status", "Calibration Data"
+]
+DATE_COLUMNS = ["Next Calibration", "Entry Date", "Last Modified", "Change Date"]
+# Date columns kept with their time of day, so edits made on the same day still order
+TIMESTAMP_COLUMNS = ["Last Modified"]
+INVENTORY_COLUMNS = [
+    "Serial Number", "Type", "Manufacturer", "KETOS P/N",
+    "Mfg P/N", "Next Calibration", "Status", "Entry Date",
+    "Last Modified", "Change Date", "Calibration Data"
+]
+
+
+def storage_filename():
+    """Name of the primary inventory file for the available format"""
+    return INVENTORY_PARQUET_FILENAME if PARQUET_AVAILABLE else INVENTORY_CSV_FILENAME
+
+
+def storage_mimetype():
+    return PARQUET_MIMETYPE if PARQUET_AVAILABLE else "text/csv"
+
+
+def apply_schema(df):
+    """Return df with the fixed inventory columns and dtypes.
+
+    Dates become datetime64 once here, so readers never re-parse them.
+    """
+    df = df.drop(columns=['Status Color'], errors='ignore').copy()
+    for column in INVENTORY_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+
+    for column in DATE_COLUMNS:
+        df[column] = parse_dates(df[column])
+    for column in TEXT_COLUMNS:
+        text = df[column].astype('string').str.strip().replace('', pd.NA)
+        df[column] = text.astype(object).where(text.notna(), None)
+
+    extra_columns = [column for column in df.columns if column not in INVENTORY_COLUMNS]
+    return df[INVENTORY_COLUMNS + extra_columns]
+
+
+def parse_dates(values):
+    """Parse a date column whose rows may use different formats.
+
+    A single inferred format would turn every row written differently (e.g.
+    "01/05/2024 10:00" among ISO dates in a legacy CSV) into NaT, so rows
+    that are not ISO 8601 are parsed one by one.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.astype('datetime64[ns]')
+    parsed = pd.to_datetime(values, errors='coerce', format='ISO8601')
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry].astype(str), errors='coerce', format='mixed')
+    return parsed.astype('datetime64[ns]')
+
+
+def serialize_inventory(df, buffer, file_format=None):
+    """Write df to a binary buffer as Parquet (or CSV if unavailable)"""
+    file_format = file_format or ('parquet' if PARQUET_AVAILABLE else 'csv')
+    if file_format == 'parquet':
+        apply_schema(df).to_parquet(buffer, index=False)
+    else:
+        df.to_csv(buffer, index=False, encoding='utf-8')
+
+
+def read_inventory_csv(source, **kwargs):
+    """Read an inventory CSV keeping text columns verbatim.
+
+    Without this pandas would turn serials like "0456" or "1e3" into numbers
+    and "NA" into a missing value; only empty cells count as missing.
+    """
+    return pd.read_csv(
+        source,
+        dtype={column: str for column in TEXT_COLUMNS},
+        keep_default_na=False,
+        na_values=[''],
+        **kwargs
+    )
+
+
+def deserialize_inventory(content, filename):
+    """Parse Parquet or CSV bytes, picking the format from the file name"""
+    if filename.endswith('.parquet'):
+        df = pd.read_parquet(io.BytesIO(content))
+    else:
+        df = read_inventory_csv(io.StringIO(content.decode('utf-8')))
+    return apply_schema(df)
+
+
+def write_local_file(df, path=None):
+    """Write the inventory to local disk atomically in the primary format"""
+    path = path or storage_filename()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        serialize_inventory(df, f, 'parquet' if path.endswith('.parquet') else 'csv')
+    os.replace(temp_path, path)
+    return path
+
+
+def read_local_file(path=None):
+    """Read the local inventory file, or None if there is none"""
+    path = path or storage_filename()
+    if not os.path.exists(path):
+        return None
+    if path.endswith('.parquet'):
+        df = pd.read_parquet(path, memory_map=True)
+    else:
+        df = read_inventory_csv(path)
+    return apply_schema(df)
+
+
+def format_date(value):
+    """Render a schema date value for display"""
+    if value is None or pd.isna(value):
+        return "N/A"
+    return pd.Timestamp(value).strftime('%Y-%m-%d')
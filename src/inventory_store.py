@@ -0,0 +1,291 @@
+import streamlit as st
+import pandas as pd
+import threading
+import time
+import logging
+from collections import OrderedDict
+from .serial_allocator import SerialAllocator
+from .inventory_merge import merge_inventories
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between Drive revision checks
+FRESHNESS_CHECK_INTERVAL = 30
+# Derived views (search indexes, aggregates) kept across versions
+DERIVED_CACHE_SIZE = 32
+
+
+class InventoryStore:
+    """Process-wide inventory shared by every browser session.
+
+    Sessions hold a reference to the store's DataFrame rather than a copy.
+    Every change bumps ``version`` so sessions can tell when to re-read, and
+    changed serial numbers are tracked until they are synced to Drive: dirty
+    until a flush takes them, then in flight until it succeeds.
+
+    The frame always has a RangeIndex, and a serial number -> row hash index
+    makes single-probe reads and writes O(1) instead of a column scan.
+
+    Drive is checked and downloaded without holding the lock, so a reload
+    never blocks other sessions' reads and edits; one reload runs at a time
+    and the new frame is swapped in under the lock.
+    """
+
+    def __init__(self, check_interval=FRESHNESS_CHECK_INTERVAL):
+        self._lock = threading.RLock()
+        self._loaded = threading.Condition(self._lock)
+        self._loading = False
+        self._df = None
+        self.version = 0
+        self.revision = None
+        self.check_interval = check_interval
+        self._last_check = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._dirty = set()
+        self._in_flight = set()  # taken by a flush that has not finished
+        self._positions = None  # serial -> row label, rebuilt lazily
+        self.serials = SerialAllocator()
+        self._derived = OrderedDict()  # (name, key) -> (version, value)
+
+    def get(self, drive_manager=None, folder_id=None):
+        """Return the shared inventory, reloading it if Drive has changed"""
+        with self._lock:
+            check_due = self._check_due(drive_manager, folder_id)
+            if self._df is not None and not check_due:
+                self.hits += 1
+                return self._df
+
+        if self._df is not None and not self._is_stale(drive_manager, folder_id):
+            with self._lock:
+                self.hits += 1
+                return self._df
+
+        with self._lock:
+            self.misses += 1
+        if drive_manager is not None and folder_id:
+            self._load(drive_manager, folder_id)
+        return self.current()
+
+    def refresh(self, drive_manager, folder_id):
+        """Force a reload from Drive regardless of its revision"""
+        with self._lock:
+            self.misses += 1
+        self._load(drive_manager, folder_id)
+        return self.current()
+
+    def current(self):
+        """Return the shared inventory without checking Drive or counting a hit"""
+        with self._lock:
+            return self._df
+
+    def snapshot(self):
+        """Return a copy of the shared inventory that is safe to read off-thread"""
+        with self._lock:
+            return None if self._df is None else self._df.copy()
+
+    def publish(self, df):
+        """Replace the shared inventory after a local change"""
+        with self._lock:
+            self._replace(df)
+            return self._df
+
+    def append(self, rows_df):
+        """Append new rows to the shared inventory"""
+        with self._lock:
+            if self._df is None:
+                self._replace(rows_df)
+            else:
+                start = len(self._df)
+                self._df = pd.concat([self._df, rows_df], ignore_index=True)
+                self.version += 1
+                # Extend the index instead of rebuilding it
+                if self._positions is not None:
+                    for offset, serial in enumerate(rows_df['Serial Number']):
+                        self._positions[serial] = start + offset
+                self.serials.observe(rows_df)
+            self._dirty.update(rows_df['Serial Number'])
+            return self._df
+
+    def locate(self, serial_number):
+        """Row label of a serial number, or None"""
+        with self._lock:
+            if self._df is None:
+                return None
+            return self._index().get(serial_number)
+
+    def get_probe(self, serial_number):
+        """Return one probe's row as a Series, or None"""
+        with self._lock:
+            label = self.locate(serial_number)
+            return None if label is None else self._df.loc[label]
+
+    def next_sequence(self, probe_type):
+        """Next serial sequence number for a probe type, without reserving it"""
+        with self._lock:
+            return self.serials.peek(probe_type, self._df)
+
+    def allocate_sequences(self, probe_type, count=1):
+        """Reserve count consecutive serial sequence numbers and return the first"""
+        with self._lock:
+            return self.serials.allocate(probe_type, self._df, count)
+
+    def update_rows(self, serial_numbers, values):
+        """Set column values on the rows matching the given serial numbers"""
+        with self._lock:
+            if self._df is None:
+                return 0
+            index = self._index()
+            found = [serial for serial in serial_numbers if serial in index]
+            if found:
+                labels = [index[serial] for serial in found]
+                for column, value in values.items():
+                    self._df.loc[labels, column] = value
+                self._dirty.update(found)
+                self.version += 1
+            return len(found)
+
+    def derived(self, name, builder, key=None):
+        """Return builder(inventory) memoized for the current version.
+
+        Sessions asking for the same (name, key) share one result until the
+        inventory changes. The builder runs on a snapshot outside the lock so
+        writers are not held up by it.
+        """
+        cache_key = (name, key)
+        with self._lock:
+            if self._df is None:
+                return None
+            entry = self._derived.get(cache_key)
+            if entry is not None and entry[0] == self.version:
+                self._derived.move_to_end(cache_key)
+                return entry[1]
+            version, df = self.version, self._df.copy()
+
+        value = builder(df)
+        with self._lock:
+            if self.version == version:
+                self._derived[cache_key] = (version, value)
+                self._derived.move_to_end(cache_key)
+                while len(self._derived) > DERIVED_CACHE_SIZE:
+                    self._derived.popitem(last=False)
+        return value
+
+    def take_dirty(self):
+        """Return and clear the serial numbers changed since the last sync.
+
+        They stay in flight, and survive reloads, until mark_synced or
+        mark_dirty settles them.
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            self._in_flight |= dirty
+            return dirty
+
+    def dirty_count(self):
+        """Number of serial numbers changed since the last sync"""
+        with self._lock:
+            return len(self._dirty)
+
+    def mark_dirty(self, serial_numbers):
+        """Re-queue serial numbers whose sync failed"""
+        with self._lock:
+            self._dirty.update(serial_numbers)
+            self._in_flight.difference_update(serial_numbers)
+
+    def mark_synced(self, serial_numbers):
+        """Settle serial numbers whose sync succeeded"""
+        with self._lock:
+            self._in_flight.difference_update(serial_numbers)
+
+    def invalidate(self):
+        """Force the next get() to re-check Drive"""
+        with self._lock:
+            self._last_check = 0.0
+            self.revision = None
+
+    def stats(self):
+        """Return cache counters for display"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "Version": self.version,
+                "Records": 0 if self._df is None else len(self._df),
+                "Drive Revision": self.revision,
+                "Unsynced Changes": len(self._dirty | self._in_flight),
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "Hit Rate": f"{self.hits / total * 100:.1f}%" if total else "0%"
+            }
+
+    def _replace(self, df):
+        self._df = df.reset_index(drop=True)
+        self._positions = None
+        self.serials.reset()
+        self.version += 1
+
+    def _index(self):
+        if self._positions is None:
+            self._positions = dict(zip(self._df['Serial Number'], self._df.index))
+        return self._positions
+
+    def _check_due(self, drive_manager, folder_id):
+        """Claim the next Drive revision check; at most one per check interval.
+
+        Called under the lock. Nothing is due while a reload is running.
+        """
+        if drive_manager is None or not folder_id or self._loading:
+            return False
+        if self._df is not None and time.monotonic() - self._last_check < self.check_interval:
+            return False
+        self._last_check = time.monotonic()
+        return True
+
+    def _is_stale(self, drive_manager, folder_id):
+        """Ask Drive whether its revision differs from the loaded one (no lock held)"""
+        revision = drive_manager.get_inventory_revision(folder_id)
+        return revision is not None and revision != self.revision
+
+    def _load(self, drive_manager, folder_id):
+        """Reload from Drive, or wait for the reload another session started"""
+        with self._lock:
+            if self._loading:
+                while self._loading:
+                    self._loaded.wait()
+                return
+            self._loading = True
+
+        try:
+            # Network I/O and parsing happen outside the lock
+            revision = drive_manager.get_inventory_revision(folder_id)
+            df = drive_manager.load_inventory_from_drive(folder_id)
+            if df is not None and 'Status Color' in df.columns:
+                df = df.drop('Status Color', axis=1)
+
+            with self._lock:
+                self._last_check = time.monotonic()
+                if df is None:
+                    return
+
+                # Keep local edits that have not reached Drive yet, including
+                # any made during the download and any a flush is still sending
+                unsynced = self._dirty | self._in_flight
+                if self._df is not None and unsynced:
+                    pending = self._df[self._df['Serial Number'].isin(unsynced)]
+                    df, _ = merge_inventories(df, pending)
+
+                self._replace(df)
+                self.revision = revision
+                logger.info(f"Inventory store loaded version {self.version}: {len(df)} records")
+        finally:
+            with self._lock:
+                self._loading = False
+                self._loaded.notify_all()
+
+
+@st.cache_resource
+def get_inventory_store():
+    """Get the single inventory store for this server process"""
+    return InventoryStore()
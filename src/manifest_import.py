@@ -0,0 +1,105 @@
+import pandas as pd
+import os
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# pandas reads .xlsx through openpyxl; without it only CSV manifests are accepted
+try:
+    import openpyxl  # noqa: F401
+    XLSX_AVAILABLE = True
+except ImportError:
+    XLSX_AVAILABLE = False
+MANIFEST_TYPES = ["csv", "xlsx"] if XLSX_AVAILABLE else ["csv"]
+MAX_MANIFEST_ROWS = 5000
+
+# Manifest column -> accepted header spellings (compared case-insensitively)
+MANIFEST_COLUMNS = {
+    "Type": ["type", "probe type"],
+    "Manufacturer": ["manufacturer", "supplier"],
+    "Mfg P/N": ["mfg p/n", "manufacturer part number", "mfg part number"],
+    "KETOS P/N": ["ketos p/n", "ketos part number"],
+    "Manufacturing Date": ["manufacturing date", "mfg date", "date of manufacture"],
+}
+REQUIRED_COLUMNS = ["Type", "Manufacturer", "Mfg P/N", "Manufacturing Date"]
+
+
+def read_manifest(uploaded_file):
+    """Read a supplier manifest (CSV or XLSX) with its headers normalised"""
+    name = getattr(uploaded_file, "name", str(uploaded_file))
+    extension = os.path.splitext(name)[1].lower()
+    if extension == ".xlsx":
+        if not XLSX_AVAILABLE:
+            raise ValueError("Reading .xlsx manifests requires openpyxl; upload a CSV instead")
+        df = pd.read_excel(uploaded_file, dtype=str)
+    elif extension == ".csv":
+        df = pd.read_csv(uploaded_file, dtype=str, skipinitialspace=True)
+    else:
+        raise ValueError(f"Unsupported manifest type: {extension or name}")
+
+    aliases = {alias: column for column, names in MANIFEST_COLUMNS.items() for alias in names}
+    df = df.rename(columns=lambda header: aliases.get(str(header).strip().lower(), str(header).strip()))
+    # Keep the original index so problems point at the right spreadsheet row
+    df = df.dropna(how="all")
+    return df
+
+
+def validate_manifest(manifest_df, part_numbers, today=None):
+    """Split a manifest into rows ready to register and a table of problems.
+
+    part_numbers maps each probe type to its KETOS part numbers; a blank
+    KETOS P/N is filled with the type's first one. Every check runs over
+    the whole manifest at once. Problems carry the spreadsheet row number
+    (header is row 1) so they can be fixed at the source.
+    """
+    today = pd.Timestamp.now().normalize() if today is None else today
+    missing = [column for column in REQUIRED_COLUMNS if column not in manifest_df.columns]
+    if missing:
+        problems = pd.DataFrame({"Row": None, "Column": missing, "Problem": "Missing column"})
+        return manifest_df.iloc[0:0], problems
+    if len(manifest_df) > MAX_MANIFEST_ROWS:
+        problems = pd.DataFrame({"Row": [None], "Column": [None],
+                                 "Problem": [f"More than {MAX_MANIFEST_ROWS} rows; split the manifest"]})
+        return manifest_df.iloc[0:0], problems
+
+    df = manifest_df.copy()
+    for column in MANIFEST_COLUMNS:
+        if column not in df.columns:
+            df[column] = None
+        df[column] = df[column].astype(object).where(df[column].notna(), None)
+        df[column] = df[column].str.strip().replace("", None)
+
+    checks = []
+    for column in REQUIRED_COLUMNS:
+        checks.append((column, df[column].isna(), "Required value is empty"))
+    checks.append(("Type", df["Type"].notna() & ~df["Type"].isin(part_numbers),
+                   f"Unknown probe type; expected one of {', '.join(part_numbers)}"))
+
+    dates = pd.to_datetime(df["Manufacturing Date"], errors="coerce")
+    checks.append(("Manufacturing Date", df["Manufacturing Date"].notna() & dates.isna(), "Not a date"))
+    checks.append(("Manufacturing Date", dates > today, "Date is in the future"))
+
+    defaults = df["Type"].map({probe_type: numbers[0] for probe_type, numbers in part_numbers.items() if numbers})
+    df["KETOS P/N"] = df["KETOS P/N"].fillna(defaults)
+    known_parts = pd.MultiIndex.from_tuples(
+        [(probe_type, part) for probe_type, numbers in part_numbers.items() for part in numbers]
+    )
+    allowed = pd.MultiIndex.from_arrays([df["Type"], df["KETOS P/N"]]).isin(known_parts)
+    checks.append(("KETOS P/N", df["KETOS P/N"].notna() & df["Type"].isin(part_numbers) & ~allowed,
+                   "Part number does not match the probe type"))
+
+    frames = [
+        pd.DataFrame({"Row": df.index[mask] + 2, "Column": column, "Problem": problem})
+        for column, mask, problem in checks
+        if mask.any()
+    ]
+    if not frames:
+        problems = pd.DataFrame(columns=["Row", "Column", "Problem"])
+    else:
+        problems = pd.concat(frames, ignore_index=True).sort_values("Row", kind="stable").reset_index(drop=True)
+
+    df["Manufacturing Date"] = dates
+    valid = df.drop(index=problems["Row"].astype(int).unique() - 2)
+    return valid[list(MANIFEST_COLUMNS)].reset_index(drop=True), problems
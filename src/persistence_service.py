@@ -0,0 +1,136 @@
+import threading
+import random
+import time
+import os
+import logging
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between checkpoints, overridable for deployments
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", 600))
+# Each wait is randomized by up to this fraction so restarted replicas drift apart
+PERSISTENCE_JITTER = 0.1
+# Retry delays after a failed checkpoint: RETRY_BASE * 2**n, capped at MAX_BACKOFF
+RETRY_BASE = 30.0
+MAX_BACKOFF = 1800.0
+
+
+class PersistenceService:
+    """Process-wide background checkpointing of the shared inventory.
+
+    One worker thread, started with ``start()`` and stopped with ``stop()``
+    (which also writes a final checkpoint). Each cycle pushes pending edits
+    with ``flush()`` and then, only if the store version moved since the last
+    checkpoint, writes ``checkpoint(inventory_df)``, which returns the number
+    of bytes written. A failed flush still checkpoints locally, and failures
+    are retried with jittered exponential backoff.
+    """
+
+    def __init__(self, store, checkpoint, flush=None, interval=PERSISTENCE_INTERVAL,
+                 jitter=PERSISTENCE_JITTER, retry_base=RETRY_BASE, max_backoff=MAX_BACKOFF):
+        self._store = store
+        self._checkpoint = checkpoint
+        self._flush = flush
+        self.interval = interval
+        self.jitter = jitter
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._checkpointed_version = None
+        self.failures = 0
+        self.checkpoints = 0
+        self.last_flush_time = None
+        self.last_bytes = 0
+        self.last_duration = None
+        self.last_error = None
+        self.next_run = None
+
+    def start(self):
+        """Start the worker if it is not already running"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return False
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="inventory-persistence", daemon=True)
+            self._worker.start()
+            logger.info(f"Started persistence service (every {self.interval:.0f}s)")
+            return True
+
+    def stop(self, timeout=30):
+        """Stop the worker and write a final checkpoint"""
+        with self._lock:
+            worker, self._worker = self._worker, None
+        self._stop.set()
+        if worker is not None:
+            worker.join(timeout)
+        self.run_once()
+        logger.info("Stopped persistence service")
+
+    def is_running(self):
+        with self._lock:
+            return self._worker is not None and self._worker.is_alive()
+
+    def run_once(self):
+        """Flush pending edits and checkpoint if anything changed; True on success"""
+        try:
+            flushed = self._flush is None or self._flush()
+
+            version = self._store.version
+            inventory_df = self._store.snapshot()
+            if inventory_df is not None and version != self._checkpointed_version:
+                started = time.monotonic()
+                written = self._checkpoint(inventory_df)
+                self.last_duration = time.monotonic() - started
+                self.last_bytes = written or 0
+                self.last_flush_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self._checkpointed_version = version
+                self.checkpoints += 1
+                logger.info(
+                    f"Checkpointed inventory version {version}: "
+                    f"{self.last_bytes} bytes in {self.last_duration:.2f}s"
+                )
+
+            # The local checkpoint still counts, but Drive errors drive the backoff
+            if not flushed:
+                raise RuntimeError("pending edits could not be flushed to Drive")
+            self.failures = 0
+            self.last_error = None
+            return True
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.error(f"Checkpoint failed ({self.failures} in a row): {str(e)}")
+            return False
+
+    def metrics(self):
+        """Return checkpoint metrics for display"""
+        return {
+            "Running": self.is_running(),
+            "Last Checkpoint": self.last_flush_time,
+            "Bytes Written": self.last_bytes,
+            "Duration (s)": None if self.last_duration is None else round(self.last_duration, 3),
+            "Checkpoints": self.checkpoints,
+            "Consecutive Failures": self.failures,
+            "Next Run In (s)": None if self.next_run is None else max(0, round(self.next_run - time.monotonic()))
+        }
+
+    def _delay(self):
+        """Seconds until the next cycle: the interval, or a backoff after failures"""
+        if self.failures:
+            delay = min(self.max_backoff, self.retry_base * 2 ** (self.failures - 1))
+        else:
+            delay = self.interval
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _run(self):
+        while True:
+            delay = self._delay()
+            self.next_run = time.monotonic() + delay
+            if self._stop.wait(delay):
+                return
+            self.run_once()
@@ -1,14 +1,19 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
 import logging
+import hashlib
 import time
 from .drive_manager import DriveManager
 from .inventory_manager import (
     add_new_probe,
+    allocate_serial_numbers,
     get_next_serial_number,
-    save_inventory
+    initialize_inventory,
+    register_probes
 )
+from .inventory_store import get_inventory_store
+from .inventory_merge import merge_inventories
+from .manifest_import import MANIFEST_COLUMNS, MANIFEST_TYPES, read_manifest, validate_manifest
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,13 +37,8 @@ SERVICE_LIFE = {
 
 def registration_page():
     """Main page for probe registration"""
-    # Initialize inventory if not exists
-    if 'inventory' not in st.session_state:
-        st.session_state.inventory = pd.DataFrame(columns=[
-            "Serial Number", "Type", "Manufacturer", "KETOS P/N",
-            "Mfg P/N", "Next Calibration", "Status", "Entry Date",
-            "Last Modified", "Status Color", "Change Date", "Calibration Data"
-        ])
+    # Read the shared inventory
+    initialize_inventory()
 
     # Sidebar for Drive settings
     with st.sidebar:
@@ -63,6 +63,11 @@ def registration_page():
     # Title
     st.markdown('<h1 style="font-family: Arial; color: #0071ba;">📋 Probe Registration</h1>', unsafe_allow_html=True)
 
+    mode = st.radio("Registration Mode", ["Single Probe", "Bulk Import"], horizontal=True)
+    if mode == "Bulk Import":
+        render_bulk_registration()
+        return
+
     # Input Fields
     col1, col2 = st.columns(2)
     with col1:
@@ -148,6 +153,15 @@ def registration_page():
             st.error("Please fill in all required fields.")
             return
 
+        # Reserve the serial number now; another session may have taken the previewed one
+        allocated = allocate_serial_numbers(probe_type, manufacturing_date)
+        if not allocated:
+            st.error("❌ Failed to allocate a serial number.")
+            return
+        if allocated[0] != serial_number:
+            st.info(f"ℹ️ {serial_number} was just taken; this probe was assigned {allocated[0]}.")
+        serial_number = allocated[0]
+
         # Prepare and save probe data
         probe_data = {
             "Serial Number": serial_number,
@@ -157,20 +171,16 @@ def registration_page():
             "Mfg P/N": manufacturer_part_number,
             "Status": "Pending Calibration",
             "Entry Date": datetime.now().strftime("%Y-%m-%d"),
-            "Last Modified": datetime.now().strftime("%Y-%m-%d"),
+            "Last Modified": datetime.now(),
             "Change Date": datetime.now().strftime("%Y-%m-%d"),
-            "Calibration Data": {}  # Empty calibration data
+            "Calibration Data": None  # Calibrations are kept in the calibration history
         }
 
         success = add_new_probe(probe_data)
         if success:
             st.success(f"✅ Probe {serial_number} registered successfully!")
             if 'drive_manager' in st.session_state and 'drive_folder_id' in st.session_state:
-                if st.session_state.drive_manager.save_to_drive(st.session_state.inventory, st.session_state.drive_folder_id):
-                    st.success("✅ Inventory saved to Google Drive.")
-                    st.session_state['last_save_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                else:
-                    st.warning("⚠️ Failed to save to Google Drive. Data saved locally.")
+                st.success("✅ Inventory queued for saving to Google Drive.")
             else:
                 st.warning("⚠️ Google Drive not configured. Data saved locally.")
             time.sleep(1)  # Delay for user feedback
@@ -178,6 +188,68 @@ def registration_page():
         else:
             st.error("❌ Failed to register probe.")
 
+def render_bulk_registration():
+    """Register a batch of probes from a supplier manifest"""
+    st.markdown("### Import Supplier Manifest")
+    template = ",".join(MANIFEST_COLUMNS) + "\n"
+    st.download_button(
+        "Download Manifest Template",
+        data=template,
+        file_name="probe_manifest_template.csv",
+        mime="text/csv"
+    )
+
+    uploaded = st.file_uploader("Supplier Manifest", type=MANIFEST_TYPES)
+    if uploaded is None:
+        return
+
+    content = uploaded.getvalue()
+    manifest_hash = hashlib.sha256(content).hexdigest()
+    registered = st.session_state.get('bulk_registration')
+    if registered is not None and registered['hash'] == manifest_hash:
+        st.success(f"✅ Registered {len(registered['probes'])} probes from {uploaded.name}")
+        st.dataframe(registered['probes'], hide_index=True, use_container_width=True)
+        st.download_button(
+            "Download Assigned Serial Numbers",
+            data=registered['probes'].to_csv(index=False),
+            file_name=f"registered_probes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv"
+        )
+        return
+
+    try:
+        manifest = read_manifest(uploaded)
+    except Exception as e:
+        st.error(f"❌ Could not read the manifest: {str(e)}")
+        return
+
+    valid, problems = validate_manifest(manifest, KETOS_PART_NUMBERS)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Probes Ready", len(valid))
+    with col2:
+        st.metric("Rows With Problems", problems['Row'].nunique())
+
+    if not problems.empty:
+        st.warning("⚠️ Fix these rows in the manifest, or register only the valid probes.")
+        st.dataframe(problems, hide_index=True, use_container_width=True)
+    if valid.empty:
+        return
+
+    st.markdown("#### Probes by Type")
+    st.dataframe(valid['Type'].value_counts().rename_axis('Type').reset_index(name='Count'), hide_index=True)
+    with st.expander("Preview"):
+        st.dataframe(valid, hide_index=True, use_container_width=True)
+
+    if st.button(f"Register {len(valid)} Probes"):
+        with st.spinner("Registering probes..."):
+            probes = register_probes(valid)
+        if probes is None:
+            st.error("❌ Failed to register probes.")
+            return
+        st.session_state['bulk_registration'] = {'hash': manifest_hash, 'probes': probes}
+        st.rerun()
+
 def load_inventory_from_drive():
     """Load the inventory CSV from Google Drive into the app's session state."""
     try:
@@ -192,37 +264,29 @@ def load_inventory_from_drive():
             st.error("❌ Google Drive folder ID is not set. Please configure your settings.")
             return False
 
-        # Download the file from Google Drive
+        # Reload the shared inventory from Google Drive
         st.info("📂 Attempting to load the inventory CSV from Google Drive...")
-        file_content = drive_manager.download_inventory_csv(folder_id, "wbpms_inventory_2024.csv")
+        store = get_inventory_store()
+        session_inventory = st.session_state.get('inventory')
+        existing_inventory = store.refresh(drive_manager, folder_id)
+        if existing_inventory is None:
+            raise FileNotFoundError(f"File 'wbpms_inventory_2024.csv' not found in folder '{folder_id}'.")
 
-        # Parse the CSV content
-        existing_inventory = pd.read_csv(file_content)
-
-        # Merge with session state inventory, avoiding duplicates
-        if 'inventory' in st.session_state and not st.session_state.inventory.empty:
-            st.session_state.inventory = pd.concat(
-                [st.session_state.inventory, existing_inventory]
-            ).drop_duplicates(subset="Serial Number", keep="last")
+        # Upsert Drive's rows into the session inventory, one row per serial number
+        if (session_inventory is not None and not session_inventory.empty
+                and session_inventory is not existing_inventory):
+            merged, stats = merge_inventories(session_inventory, existing_inventory)
+            st.session_state.inventory = store.publish(merged)
+            st.info(
+                f"📊 {stats['inserted']} probes added, {stats['updated']} updated, "
+                f"{stats['unchanged']} unchanged"
+            )
         else:
             st.session_state.inventory = existing_inventory
 
         return True
     except FileNotFoundError:
         st.warning("⚠️ Inventory file not found. A new file will be created.")
-        st.session_state.inventory = pd.DataFrame(columns=[
-            "Serial Number", "Type", "Manufacturer", "KETOS P/N",
-            "Mfg P/N", "Next Calibration", "Status", "Entry Date",
-            "Last Modified", "Change Date", "Calibration Data"
-        ])
-        return True
-    except pd.errors.EmptyDataError:
-        st.warning("⚠️ Inventory file is empty. Starting with a new inventory.")
-        st.session_state.inventory = pd.DataFrame(columns=[
-            "Serial Number", "Type", "Manufacturer", "KETOS P/N",
-            "Mfg P/N", "Next Calibration", "Status", "Entry Date",
-            "Last Modified", "Change Date", "Calibration Data"
-        ])
         return True
     except Exception as e:
         st.error(f"❌ Failed to load inventory. Error: {e}")
@@ -0,0 +1,52 @@
+import logging
+from functools import partial
+from .inventory_store import get_inventory_store
+from .inventory_manager import STATUS_BADGES, DEFAULT_BADGE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PAGE_SIZES = [50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+
+
+def status_badges(status):
+    """'🟢 Calibrated'-style labels for a Status column, in one vectorized pass"""
+    return status.map(STATUS_BADGES).fillna(DEFAULT_BADGE) + " " + status.fillna("").astype(str)
+
+
+def review_view(inventory_df, status_filter):
+    """Display rows and status counts for one Inventory Review filter.
+
+    The Status column carries its colour badge, so the table needs no
+    Styler and only plain values are sent to the browser.
+    """
+    if status_filter == "All":
+        rows = inventory_df
+    else:
+        rows = inventory_df[inventory_df['Status'] == status_filter]
+    return {
+        'inventory': rows,
+        'rows': rows.assign(Status=status_badges(rows['Status'])).reset_index(drop=True),
+        'counts': rows['Status'].value_counts(),
+        'total': len(rows)
+    }
+
+
+def get_review_view(inventory_df, status_filter):
+    """Review rows for the filter, memoized on (inventory version, filter)"""
+    builder = partial(review_view, status_filter=status_filter)
+    view = get_inventory_store().derived('review_view', builder, key=status_filter)
+    return builder(inventory_df) if view is None else view
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+def page_rows(view, page, page_size):
+    """One page of a review view; page numbers start at 1"""
+    page = min(max(1, page), page_count(view['total'], page_size))
+    start = (page - 1) * page_size
+    return view['rows'].iloc[start:start + page_size]
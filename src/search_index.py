@@ -0,0 +1,107 @@
+import numpy as np
+import logging
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEARCH_COLUMNS = ['Serial Number', 'Type', 'Manufacturer', 'Status']
+
+
+def _trigram_codes(byte_matrix):
+    """Encode every 3-byte window of each row as one integer; windows over padding are -1"""
+    a = byte_matrix.astype(np.int64)
+    codes = (a[:, :-2] << 16) | (a[:, 1:-1] << 8) | a[:, 2:]
+    codes[(a[:, :-2] == 0) | (a[:, 1:-1] == 0) | (a[:, 2:] == 0)] = -1
+    return codes
+
+
+class ProbeSearchIndex:
+    """Lowercase trigram index over serial, type, manufacturer and status.
+
+    Built once per inventory version with vectorized numpy operations; a query
+    intersects the posting lists of its trigrams and only verifies and ranks
+    the surviving candidates.
+    """
+
+    def __init__(self, inventory_df):
+        df = inventory_df[SEARCH_COLUMNS].fillna('').astype(str)
+        self.serials = df['Serial Number'].to_numpy()
+        self.types = df['Type'].to_numpy()
+        self.manufacturers = df['Manufacturer'].to_numpy()
+        self.statuses = df['Status'].to_numpy()
+        self.serials_lower = np.char.lower(self.serials.astype(str))
+        self.search_text = (
+            df['Serial Number'] + ' ' + df['Type'] + ' ' + df['Manufacturer'] + ' ' + df['Status']
+        ).str.lower().to_numpy().astype(str)
+
+        # Posting lists: trigram code -> row ids, stored as two sorted arrays
+        if len(df):
+            encoded = np.char.encode(self.search_text, 'utf-8')
+            width = max(encoded.dtype.itemsize, 3)
+            byte_matrix = np.frombuffer(encoded.astype(f'S{width}').tobytes(), dtype=np.uint8)
+            codes = _trigram_codes(byte_matrix.reshape(len(df), width))
+            rows = np.broadcast_to(np.arange(len(df), dtype=np.int64)[:, None], codes.shape)
+            valid = codes >= 0
+            # Pack (trigram, row) into one int64 so a flat sort dedupes and orders both
+            keys = np.sort((codes[valid] << 32) | rows[valid])
+            keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+            self._codes, self._rows = keys >> 32, keys & 0xFFFFFFFF
+        else:
+            self._codes = self._rows = np.array([], dtype=np.int64)
+        logger.info(f"Built probe search index over {len(df)} probes")
+
+    def __len__(self):
+        return len(self.serials)
+
+    def search(self, query, limit=5):
+        """Return up to limit probes whose fields contain query, best matches first"""
+        query = query.strip().lower()
+        if not query or not len(self):
+            return []
+
+        candidates = self._candidates(query)
+        if len(candidates):
+            texts = self.search_text[candidates]
+            candidates = candidates[np.char.find(texts, query) >= 0]
+        if not len(candidates):
+            return []
+
+        # Rank: serial prefix, then serial substring, then any other field
+        serials = self.serials_lower[candidates]
+        rank = np.where(
+            np.char.startswith(serials, query), 0,
+            np.where(np.char.find(serials, query) >= 0, 1, 2)
+        )
+        order = np.lexsort((serials, rank))[:limit]
+        return [self._result(row) for row in candidates[order]]
+
+    def _candidates(self, query):
+        """Rows containing every trigram of the query (all rows for short queries)"""
+        encoded = np.frombuffer(query.encode('utf-8'), dtype=np.uint8)
+        if len(encoded) < 3:
+            return np.arange(len(self))
+
+        query_codes = np.unique(_trigram_codes(encoded[None, :])[0])
+        postings = []
+        for code in query_codes:
+            start, end = np.searchsorted(self._codes, [code, code + 1])
+            postings.append(self._rows[start:end])
+        postings.sort(key=len)
+        candidates = postings[0]
+        for rows in postings[1:]:
+            if not len(candidates):
+                break
+            candidates = np.intersect1d(candidates, rows, assume_unique=True)
+        return candidates
+
+    def _result(self, row):
+        serial, probe_type, status = self.serials[row], self.types[row], self.statuses[row]
+        return {
+            'serial': serial,
+            'type': probe_type,
+            'manufacturer': self.manufacturers[row],
+            'status': status,
+            'display': f"{serial} - {probe_type} ({status})",
+            'search_text': self.search_text[row]
+        }
@@ -0,0 +1,120 @@
+import pandas as pd
+import threading
+import json
+import os
+import logging
+from contextlib import contextmanager
+
+try:
+    import fcntl
+    FILE_LOCKING = True
+except ImportError:  # Windows: run a single server process per sidecar
+    FILE_LOCKING = False
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEQUENCE_FILENAME = "wbpms_serial_sequences.json"
+
+
+def sequence_numbers(inventory_df):
+    """Highest serial sequence number per probe type, parsed in one vectorized pass"""
+    if inventory_df is None or inventory_df.empty:
+        return {}
+    sequences = pd.to_numeric(
+        inventory_df['Serial Number'].astype(str).str.rsplit('_', n=1).str[-1],
+        errors='coerce'
+    )
+    highest = sequences.groupby(inventory_df['Type']).max().dropna()
+    return {probe_type: int(value) for probe_type, value in highest.items()}
+
+
+class SerialAllocator:
+    """Per-type sequence counters for new serial numbers.
+
+    Counters are rebuilt from the inventory once per loaded frame and then
+    advanced in memory. Allocation happens under a lock and is written to a
+    sidecar file, so two sessions never get the same sequence and a sequence
+    is never reissued even if its probe row is later removed. Server
+    processes sharing the sidecar serialise allocations on a lock file and
+    re-read the sidecar before reserving; without fcntl the sidecar must
+    belong to a single process.
+    """
+
+    def __init__(self, path=SEQUENCE_FILENAME):
+        self.path = path
+        self._lock = threading.Lock()
+        self._counters = None
+        self._persisted = self._read()
+
+    def reset(self):
+        """Forget the counters so they are rebuilt from the next frame"""
+        with self._lock:
+            self._counters = None
+
+    def observe(self, rows_df):
+        """Advance counters past newly added rows"""
+        with self._lock:
+            if self._counters is None:
+                return
+            for probe_type, sequence in sequence_numbers(rows_df).items():
+                self._counters[probe_type] = max(self._counters.get(probe_type, 0), sequence)
+
+    def peek(self, probe_type, inventory_df):
+        """Next sequence number for a type, without reserving it"""
+        with self._lock:
+            return self._ensure(inventory_df).get(probe_type, 0) + 1
+
+    def allocate(self, probe_type, inventory_df, count=1):
+        """Reserve count consecutive sequence numbers and return the first"""
+        with self._lock, self._file_lock():
+            counters = self._ensure(inventory_df)
+            # Another process may have reserved sequences since the last read
+            for other_type, sequence in self._read().items():
+                self._persisted[other_type] = max(self._persisted.get(other_type, 0), sequence)
+                counters[other_type] = max(counters.get(other_type, 0), sequence)
+            first = counters.get(probe_type, 0) + 1
+            counters[probe_type] = first + count - 1
+            self._persisted[probe_type] = counters[probe_type]
+            self._write()
+            return first
+
+    def _ensure(self, inventory_df):
+        if self._counters is None:
+            counters = sequence_numbers(inventory_df)
+            for probe_type, sequence in self._persisted.items():
+                counters[probe_type] = max(counters.get(probe_type, 0), sequence)
+            self._counters = counters
+        return self._counters
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock shared with other processes using the sidecar"""
+        if not FILE_LOCKING:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self):
+        try:
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    return {probe_type: int(value) for probe_type, value in json.load(f).items()}
+        except Exception as e:
+            logger.error(f"Error reading serial sequences: {str(e)}")
+        return {}
+
+    def _write(self):
+        try:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self._persisted, f)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving serial sequences: {str(e)}")
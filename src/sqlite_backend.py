@@ -0,0 +1,165 @@
+import pandas as pd
+import sqlite3
+import threading
+import os
+import logging
+
+from .inventory_storage import INVENTORY_COLUMNS, DATE_COLUMNS, TIMESTAMP_COLUMNS, apply_schema
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Set INVENTORY_BACKEND=sqlite to enable the embedded database
+SQLITE_PATH = os.environ.get("INVENTORY_SQLITE_PATH", "wbpms_inventory.db")
+
+# Inventory column -> SQL column
+SQL_COLUMNS = {
+    "Serial Number": "serial_number",
+    "Type": "type",
+    "Manufacturer": "manufacturer",
+    "KETOS P/N": "ketos_pn",
+    "Mfg P/N": "mfg_pn",
+    "Next Calibration": "next_calibration",
+    "Status": "status",
+    "Entry Date": "entry_date",
+    "Last Modified": "last_modified",
+    "Change Date": "change_date",
+    "Calibration Data": "calibration_data",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS inventory (
+    serial_number TEXT PRIMARY KEY,
+    type TEXT,
+    manufacturer TEXT,
+    ketos_pn TEXT,
+    mfg_pn TEXT,
+    next_calibration TEXT,
+    status TEXT,
+    entry_date TEXT,
+    last_modified TEXT,
+    change_date TEXT,
+    calibration_data TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_inventory_type ON inventory (type);
+CREATE INDEX IF NOT EXISTS idx_inventory_status ON inventory (status);
+CREATE INDEX IF NOT EXISTS idx_inventory_next_calibration ON inventory (next_calibration);
+"""
+
+
+def _date_format(column):
+    return '%Y-%m-%d %H:%M:%S.%f' if column in TIMESTAMP_COLUMNS else '%Y-%m-%d'
+
+
+def sqlite_enabled():
+    return os.environ.get("INVENTORY_BACKEND", "").lower() == "sqlite"
+
+
+def _to_sql_value(column, value):
+    """Dates are stored as ISO strings so they sort and index correctly"""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if column in DATE_COLUMNS:
+        return pd.Timestamp(value).strftime(_date_format(column))
+    return str(value)
+
+
+class SQLiteInventory:
+    """Embedded SQLite store with indexed point reads and transactional writes.
+
+    Serial Number is the primary key, and Type, Status and Next Calibration
+    are indexed, so single-probe operations are O(log n).
+    """
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        # Drive revision last mirrored into the table
+        self.synced = False
+        self.synced_revision = None
+        logger.info(f"Opened SQLite inventory at {path}")
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM inventory").fetchone()[0]
+
+    def replace_all(self, inventory_df):
+        """Replace the table contents with a full inventory in one transaction"""
+        rows = self._rows(inventory_df)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM inventory")
+            self._conn.executemany(self._upsert_sql(), rows)
+        logger.info(f"Loaded {len(rows)} records into SQLite")
+
+    def upsert(self, rows_df):
+        """Insert or replace rows keyed by serial number in one transaction"""
+        rows = self._rows(rows_df)
+        with self._lock, self._conn:
+            self._conn.executemany(self._upsert_sql(), rows)
+        return len(rows)
+
+    def update(self, serial_numbers, values):
+        """Set column values on the given serial numbers in one transaction"""
+        assignments = ", ".join(f"{SQL_COLUMNS[column]} = ?" for column in values)
+        params = [
+            [_to_sql_value(column, value) for column, value in values.items()] + [serial]
+            for serial in serial_numbers
+        ]
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                f"UPDATE inventory SET {assignments} WHERE serial_number = ?",
+                params
+            )
+            return cursor.rowcount
+
+    def get(self, serial_number):
+        """Indexed lookup of one probe, as a Series like a DataFrame row"""
+        rows = self.fetch([serial_number])
+        return None if rows.empty else rows.iloc[0]
+
+    def fetch(self, serial_numbers):
+        """Indexed lookup of several probes"""
+        serial_numbers = list(serial_numbers)
+        frames = []
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(serial_numbers), 500):
+            chunk = serial_numbers[start:start + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            frames.append(self._query(
+                f"SELECT * FROM inventory WHERE serial_number IN ({placeholders})",
+                chunk
+            ))
+        if not frames:
+            return self._query("SELECT * FROM inventory WHERE 0")
+        return pd.concat(frames, ignore_index=True)
+
+    def to_dataframe(self):
+        return self._query("SELECT * FROM inventory")
+
+    def replicate_to_drive(self, drive_manager, folder_id, serial_numbers=None):
+        """Push rows to Drive; only the given serial numbers if provided"""
+        if serial_numbers is not None:
+            return drive_manager.save_changes(self.fetch(serial_numbers), folder_id)
+        return drive_manager.save_to_drive(self.to_dataframe(), folder_id)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            df = pd.read_sql_query(sql, self._conn, params=params)
+        df = df.rename(columns={sql_name: column for column, sql_name in SQL_COLUMNS.items()})
+        return apply_schema(df)
+
+    def _upsert_sql(self):
+        columns = ", ".join(SQL_COLUMNS.values())
+        placeholders = ", ".join("?" for _ in SQL_COLUMNS)
+        return f"INSERT OR REPLACE INTO inventory ({columns}) VALUES ({placeholders})"
+
+    def _rows(self, df):
+        df = apply_schema(df)[INVENTORY_COLUMNS]
+        for column in DATE_COLUMNS:
+            df[column] = df[column].dt.strftime(_date_format(column))
+        df = df.astype(object).where(df.notna(), None)
+        return list(df.itertuples(index=False, name=None))
@@ -0,0 +1,150 @@
+import threading
+import time
+import logging
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Flush once this many probes are waiting...
+MAX_PENDING = 25
+# ...or once the oldest edit has waited this many seconds
+MAX_DELAY = 5.0
+# After a failed flush neither trigger fires before RETRY_BASE * 2**n seconds, capped at MAX_BACKOFF
+RETRY_BASE = 5.0
+MAX_BACKOFF = 300.0
+
+
+class WriteBehindQueue:
+    """Batch inventory edits and persist them from a background worker.
+
+    Edits are applied to the inventory store straight away; the store's dirty
+    set is the queue, so repeated edits to one serial number collapse into a
+    single write. ``persist(inventory_df, serial_numbers, drive_manager,
+    folder_id)`` does the actual saving and returns True on success. After a
+    failure the worker backs off exponentially before trying again, however
+    many edits are waiting.
+    """
+
+    def __init__(self, store, persist, max_pending=MAX_PENDING, max_delay=MAX_DELAY,
+                 retry_base=RETRY_BASE, max_backoff=MAX_BACKOFF):
+        self._store = store
+        self._persist = persist
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self.retry_base = retry_base
+        self.max_backoff = max_backoff
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+        self._oldest = None
+        self._in_flight = 0
+        self._drive_manager = None
+        self._folder_id = None
+        self._retry_at = None
+        self.failures = 0
+        self.last_flush_time = None
+        self.last_error = None
+
+    def submit(self, drive_manager=None, folder_id=None):
+        """Note that the store has new edits and schedule a flush"""
+        with self._cond:
+            if drive_manager is not None and folder_id:
+                self._drive_manager = drive_manager
+                self._folder_id = folder_id
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._start_worker()
+            self._cond.notify_all()
+
+    def drive_target(self):
+        """The (drive_manager, folder_id) flushes are sent to, or (None, None)"""
+        with self._cond:
+            return self._drive_manager, self._folder_id
+
+    def pending_count(self):
+        """Number of probes whose edits are not yet durable"""
+        with self._cond:
+            return self._store.dirty_count() + self._in_flight
+
+    def flush(self):
+        """Persist all pending edits now, returning True on success"""
+        with self._flush_lock:
+            serial_numbers = self._store.take_dirty()
+            with self._cond:
+                self._oldest = None
+                self._in_flight = len(serial_numbers)
+                drive_manager, folder_id = self._drive_manager, self._folder_id
+
+            if not serial_numbers:
+                with self._cond:
+                    self._cond.notify_all()
+                return True
+
+            try:
+                success = self._persist(self._store.snapshot(), serial_numbers, drive_manager, folder_id)
+            except Exception as e:
+                logger.error(f"Error flushing queued writes: {str(e)}")
+                success = False
+
+            with self._cond:
+                self._in_flight = 0
+                if success:
+                    self._store.mark_synced(serial_numbers)
+                    self.last_flush_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    self.last_error = None
+                    self.failures = 0
+                    self._retry_at = None
+                    logger.info(f"Flushed {len(serial_numbers)} queued probe changes")
+                else:
+                    # Put the edits back and retry after a growing delay
+                    self._store.mark_dirty(serial_numbers)
+                    self._oldest = time.monotonic()
+                    self.failures += 1
+                    backoff = min(self.max_backoff, self.retry_base * 2 ** (self.failures - 1))
+                    self._retry_at = self._oldest + backoff
+                    self.last_error = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    logger.warning(f"Flush failed ({self.failures} in a row), retrying in {backoff:.0f}s")
+                self._cond.notify_all()
+            return success
+
+    def wait_durable(self, timeout=None):
+        """Block until every submitted edit has been persisted"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._store.dirty_count() or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def _start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="inventory-write-behind", daemon=True)
+            self._worker.start()
+            logger.info("Started write-behind worker")
+
+    def _time_until_due(self):
+        """Seconds until the next flush is due, 0 if due now, None if idle"""
+        now = time.monotonic()
+        if self._store.dirty_count() >= self.max_pending:
+            due = now
+        elif self._oldest is None:
+            return None
+        else:
+            due = self._oldest + self.max_delay
+        # Both triggers wait out the backoff after a failure
+        if self._retry_at is not None:
+            due = max(due, self._retry_at)
+        return max(0.0, due - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                wait = self._time_until_due()
+                while wait is None or wait > 0:
+                    self._cond.wait(wait)
+                    wait = self._time_until_due()
+            self.flush()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from src.calibration_analytics import NERNST_SLOPE, BUFFER_PH, calibration_summary, flag_outliers
+from src.calibration_history import PH_BUFFERS, calibration_records
+
+
+def ph_form(slope=NERNST_SLOPE, offset=0.0, reading_error=0.02, with_mv=True):
+    form = {}
+    for label in PH_BUFFERS:
+        ph = BUFFER_PH[label]
+        form[f"{label}_initial"] = ph + reading_error
+        form[f"{label}_calibrated"] = ph
+        # An untouched form field used to submit 0.0, now it submits None
+        form[f"{label}_initial_mv"] = offset + slope * (ph - 7) if with_mv else 0.0
+    return form
+
+
+def fleet(blank_serial):
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(20):
+        serial = f"pH_2701_{i:05d}"
+        for day in ("2025-01-01", "2025-07-01"):
+            frames.append(calibration_records(
+                serial, "pH Probe", day,
+                ph_form(NERNST_SLOPE * rng.normal(0.99, 0.005), rng.normal(0, 3),
+                        rng.normal(0.02, 0.002), with_mv=serial != blank_serial)
+            ))
+    return pd.concat(frames, ignore_index=True)
+
+
+def test_blank_mv_is_missing_and_not_flagged():
+    blank = "pH_2701_00003"
+    events = fleet(blank)
+    assert events.loc[events["Serial Number"] == blank, "Initial mV"].isna().all()
+
+    summary = flag_outliers(calibration_summary(events))
+    probe = summary[summary["Serial Number"] == blank]
+    assert probe["Slope (mV/pH)"].isna().all()
+    assert not probe["Flagged"].any()
+    assert probe["Drift per Day"].notna().iloc[-1]
+
+
+def test_errors_in_different_units_do_not_cancel():
+    events = calibration_records("EC_2701_00001", "EC Probe", "2025-01-01", {
+        "ec_0_initial": 94.0, "ec_0_calibrated": 84.0,        # +10 μS/cm, +11.9 %
+        "ec_1_initial": 1403.0, "ec_1_calibrated": 1413.0,    # -10 μS/cm, -0.7 %
+        "ec_2_initial": 12.88, "ec_2_calibrated": 12.88,
+    })
+    summary = calibration_summary(events)
+    expected = (10 / 84 + 10 / 1413) / 3 * 100
+    assert np.isclose(summary["Reading Error %"].iloc[0], expected)
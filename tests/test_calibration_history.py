@@ -0,0 +1,65 @@
+import itertools
+
+from src import calibration_history
+from src.calibration_history import CalibrationHistory, calibration_records
+
+
+class SharedDrive:
+    """A Drive folder shared by several instances"""
+
+    def __init__(self):
+        self.files = {}  # id -> (name, content)
+        self._ids = itertools.count()
+
+    def names(self):
+        return sorted(name for name, _ in self.files.values())
+
+    def list_files_with_prefix(self, folder_id, prefix):
+        return [{'id': file_id, 'name': name} for file_id, (name, _) in self.files.items() if prefix in name]
+
+    def upload_file(self, path, folder_id, mimetype):
+        file_id = f"id{next(self._ids)}"
+        with open(path, 'rb') as f:
+            self.files[file_id] = (path.rsplit('/', 1)[-1], f.read())
+        return file_id
+
+    def download_file(self, file_id):
+        return self.files[file_id][1]
+
+    def trash_files(self, file_ids):
+        for file_id in list(file_ids):
+            del self.files[file_id]
+
+
+def record(history, serial):
+    history.append(calibration_records(serial, "DO Probe", "2026-01-01", {
+        "do_0_initial": 0.3, "do_0_calibrated": 0.0,
+        "do_1_initial": 98.0, "do_1_calibrated": 100.0,
+    }))
+
+
+def test_compaction_replaces_segments_on_drive(tmp_path, monkeypatch):
+    monkeypatch.setattr(calibration_history, "COMPACTION_THRESHOLD", 3)
+    drive = SharedDrive()
+    first = CalibrationHistory(str(tmp_path / "first"))
+    second = CalibrationHistory(str(tmp_path / "second"))
+    serials = [f"DO_2601_{i:05d}" for i in range(3)]
+    record(second, serials[0])
+    record(second, serials[1])
+    assert second.sync(drive, "folder")
+    assert len(drive.names()) == 2
+
+    # The first instance uploads its own segment, downloads the others, merges
+    # all three and retires them on Drive
+    record(first, serials[2])
+    assert first.sync(drive, "folder")
+    assert len(drive.names()) == 1
+    assert drive.names()[0].startswith(calibration_history.COMPACTED_PREFIX)
+    assert first._sync_state()['compacted'] == set()
+
+    # The second instance neither uploads its merged-away segments again nor loses history
+    assert second.sync(drive, "folder")
+    assert len(drive.names()) == 1
+    for serial in serials:
+        assert len(second.history(serial)) == 2
+        assert len(first.history(serial)) == 2
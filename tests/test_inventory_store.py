@@ -0,0 +1,81 @@
+import threading
+
+import pandas as pd
+
+from src.inventory_storage import apply_schema
+from src.inventory_store import InventoryStore
+from src.write_behind import WriteBehindQueue
+
+
+def inventory(status):
+    return apply_schema(pd.DataFrame({
+        "Serial Number": ["pH_2601_00001", "pH_2601_00002"],
+        "Status": [status, "Instock"],
+        "Last Modified": [pd.Timestamp("2026-01-01 09:00"), pd.Timestamp("2026-01-01 09:00")],
+    }))
+
+
+class StaleDrive:
+    """A Drive whose copy predates the local edit"""
+
+    def get_inventory_revision(self, folder_id):
+        return "stale"
+
+    def load_inventory_from_drive(self, folder_id):
+        return inventory("Instock")
+
+
+def status(store, serial):
+    return store.get_probe(serial)["Status"]
+
+
+def edited_store():
+    store = InventoryStore()
+    store.publish(inventory("Instock"))
+    store.take_dirty()
+    store.update_rows(["pH_2601_00001"], {"Status": "Shipped", "Last Modified": pd.Timestamp("2026-01-01 10:00")})
+    return store
+
+
+def test_refresh_during_failed_flush_keeps_the_edit():
+    store = edited_store()
+
+    def persist(inventory_df, serial_numbers, drive_manager, folder_id):
+        # Another session reloads from Drive while this flush is sending
+        store.refresh(StaleDrive(), "folder")
+        assert status(store, "pH_2601_00001") == "Shipped"
+        return False
+
+    queue = WriteBehindQueue(store, persist)
+    assert queue.flush() is False
+    assert status(store, "pH_2601_00001") == "Shipped"
+    assert store.take_dirty() == {"pH_2601_00001"}
+
+
+def test_successful_flush_settles_in_flight_rows():
+    store = edited_store()
+    queue = WriteBehindQueue(store, lambda *args: True)
+    assert queue.flush() is True
+    assert store.stats()["Unsynced Changes"] == 0
+
+    # Drive is now the source of truth for the row, so a reload takes its copy
+    store.refresh(StaleDrive(), "folder")
+    assert status(store, "pH_2601_00001") == "Instock"
+
+
+def test_freshness_reload_from_another_session_keeps_in_flight_edits():
+    store = edited_store()
+    store.check_interval = 0
+
+    def persist(inventory_df, serial_numbers, drive_manager, folder_id):
+        # Another session's get() sees a new Drive revision between take_dirty and the write
+        session = threading.Thread(target=store.get, args=(StaleDrive(), "folder"))
+        session.start()
+        session.join()
+        assert store.revision == "stale"
+        assert store.stats()["Unsynced Changes"] == 1
+        return True
+
+    assert WriteBehindQueue(store, persist).flush() is True
+    assert status(store, "pH_2601_00001") == "Shipped"
+    assert store.stats()["Unsynced Changes"] == 0
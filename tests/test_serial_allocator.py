@@ -0,0 +1,15 @@
+import pandas as pd
+
+from src.serial_allocator import SerialAllocator
+
+
+def test_allocators_sharing_a_sidecar_never_reissue(tmp_path):
+    path = str(tmp_path / "sequences.json")
+    inventory = pd.DataFrame({"Serial Number": ["pH_2601_00004"], "Type": ["pH Probe"]})
+    # Two server processes, each with its own in-memory counters
+    first, second = SerialAllocator(path), SerialAllocator(path)
+    assert second.peek("pH Probe", inventory) == 5
+
+    assert first.allocate("pH Probe", inventory, count=3) == 5
+    assert second.allocate("pH Probe", inventory) == 8
+    assert first.allocate("pH Probe", inventory) == 9
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pandas as pd
+
+from src.inventory_store import InventoryStore
+from src.write_behind import WriteBehindQueue
+
+
+def make_store(count):
+    store = InventoryStore()
+    store.append(pd.DataFrame({"Serial Number": [f"pH_2601_{i:05d}" for i in range(count)]}))
+    return store
+
+
+class FailingPersist:
+    def __init__(self):
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, inventory_df, serial_numbers, drive_manager, folder_id):
+        with self.lock:
+            self.calls += 1
+        return False
+
+
+def test_failed_flush_backs_off_when_over_max_pending():
+    store = make_store(30)
+    persist = FailingPersist()
+    queue = WriteBehindQueue(store, persist, max_pending=25, max_delay=60, retry_base=0.2, max_backoff=0.4)
+
+    queue.submit()
+    time.sleep(1.0)
+
+    # First attempt at once, then retries 0.2s and 0.4s apart rather than a busy loop
+    assert 2 <= persist.calls <= 5
+    assert queue.failures == persist.calls
+    assert store.dirty_count() == 30
+
+
+def test_backoff_grows_and_is_capped():
+    store = make_store(1)
+    queue = WriteBehindQueue(store, lambda *args: False, retry_base=1, max_backoff=4)
+
+    delays = []
+    for _ in range(5):
+        queue.flush()
+        delays.append(queue._retry_at - queue._oldest)
+    assert delays == [1, 2, 4, 4, 4]
+    assert queue._time_until_due() > 3
+
+
+def test_success_clears_backoff():
+    store = make_store(30)
+    results = iter([False, True])
+    queue = WriteBehindQueue(store, lambda *args: next(results), max_pending=25)
+
+    assert queue.flush() is False
+    assert queue._time_until_due() > 0
+    assert queue.flush() is True
+    assert queue.failures == 0
+    assert queue._time_until_due() is None
+    assert store.dirty_count() == 0